@@ -1,6 +1,15 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, make_response, has_request_context
 from flask_cors import CORS
 import os
+import sys
+import re
+import hmac
+import hashlib
+import contextlib
+import unicodedata
+import random
+import functools
+import collections
 import tempfile
 import json
 from datetime import datetime
@@ -14,21 +23,120 @@ import warnings
 from typing import Dict, List, Tuple, Any
 import joblib
 import traceback
+import threading
+import queue
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from openai import OpenAI
 
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+try:
+    import fcntl  # khóa file giữa các worker process (không có trên Windows)
+except ImportError:
+    fcntl = None
+
+try:
+    import soxr  # resample có trạng thái cho audio streaming
+except ImportError:
+    soxr = None
+
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+# MAX_CONTENT_LENGTH không áp dụng cho WebSocket: giới hạn từng message (~1s PCM float32 @192kHz)
+app.config['SOCK_SERVER_OPTIONS'] = {'max_message_size': 1024 * 1024}
+sock = Sock(app) if Sock else None  # WebSocket cho /assess-stream (cần flask-sock)
 
 # ========================== AUDIO FEATURE EXTRACTOR ==========================
+# Các nhóm đặc trưng: phụ thuộc, dữ liệu đầu vào (từ prepare_audio) và chi phí tương đối
+FEATURE_GROUPS = {
+    'vad': {
+        'depends': [], 'inputs': ['audio'], 'cost': 1,
+        'compute': None,  # prepare_audio luôn chạy: energy + vùng speech/pause
+    },
+    'basic': {
+        'depends': ['vad'], 'inputs': ['audio', 'energy'], 'cost': 1,
+        'compute': lambda ex, p: ex.extract_basic_features(p['audio'], p['sr'], energy=p['energy']),
+    },
+    'pitch': {
+        'depends': ['vad'], 'inputs': ['spectral_audio'], 'cost': 5,
+        'compute': lambda ex, p: ex.extract_pitch_features(p['spectral_audio'], p['sr']),
+    },
+    'mfcc': {
+        'depends': ['vad'], 'inputs': ['spectral_audio'], 'cost': 3,
+        'compute': lambda ex, p: ex.extract_mfcc_features(p['spectral_audio'], p['sr']),
+    },
+    'pauses': {
+        'depends': ['vad'], 'inputs': ['audio', 'speech_segments', 'pause_segments'], 'cost': 1,
+        'compute': lambda ex, p: ex.detect_pauses_and_speech(p['audio'], p['sr'], regions=p),
+    },
+}
+
+# "scoring" chỉ gồm những gì _calculate_audio_score dùng (pitch_std, speech_rate, sildur_mean, number_utt);
+# CognitiveAssessment luôn thêm các nhóm này khi tính điểm
+FEATURE_PROFILES = {
+    'full': ['basic', 'pitch', 'mfcc', 'pauses'],
+    'scoring': ['pitch', 'pauses'],
+}
+
 class AudioFeatureExtractor:
     """Trích xuất đặc trưng âm thanh cho đánh giá nhận thức"""
     
-    def __init__(self, sample_rate=22050):
+    def __init__(self, sample_rate=22050, trim_silence=True, skip_long_silences=False,
+                 max_internal_silence=1.0, trim_padding=0.2, feature_groups='full',
+                 vad_top_db=35.0, vad_hangover=0.15, vad_min_speech=0.1):
         self.sr = sample_rate
+        self.feature_groups = self.resolve_feature_groups('full' if feature_groups is None else feature_groups)
+        self.frame_length = 2048
+        self.hop_length = 512
+        self.trim_silence = trim_silence  # Cắt khoảng lặng đầu/cuối trước MFCC, pitch, Whisper
+        self.skip_long_silences = skip_long_silences  # Bỏ khoảng lặng dài bên trong cho đặc trưng phổ
+        self.max_internal_silence = max_internal_silence
+        self.trim_padding = trim_padding
+        self.vad_top_db = vad_top_db  # Ngưỡng speech: cách đỉnh năng lượng tối đa bao nhiêu dB
+        self.vad_noise_margin_db = 6.0  # ... và luôn cao hơn nền nhiễu ít nhất bấy nhiêu dB
+        self.vad_hangover = vad_hangover
+        self.vad_min_speech = vad_min_speech
+        
+    def resolve_feature_groups(self, feature_groups=None) -> List[str]:
+        """Chuẩn hoá lựa chọn nhóm đặc trưng (tên profile/nhóm, "scoring,mfcc" hoặc list) kèm các phụ thuộc"""
+        if feature_groups is None:
+            return list(self.feature_groups)
+        if isinstance(feature_groups, str):
+            feature_groups = [name.strip() for name in feature_groups.split(',') if name.strip()]
+        elif not isinstance(feature_groups, (list, tuple)):
+            raise ValueError(f"Invalid feature group selection: {feature_groups!r}")
+        if not feature_groups:
+            raise ValueError("Empty feature group selection")
         
+        resolved = []
+        
+        def visit(name):
+            if not isinstance(name, str):
+                raise ValueError(f"Invalid feature group: {name!r}")
+            if name in FEATURE_PROFILES:
+                for member in FEATURE_PROFILES[name]:
+                    visit(member)
+                return
+            if name not in FEATURE_GROUPS:
+                raise ValueError(f"Unknown feature group: {name}")
+            if name in resolved:
+                return
+            for dependency in FEATURE_GROUPS[name]['depends']:
+                visit(dependency)
+            resolved.append(name)
+        
+        for name in feature_groups:
+            visit(name)
+        return resolved
+    
     def load_audio(self, file_path: str) -> Tuple[np.ndarray, int]:
         """Load file âm thanh"""
         try:
@@ -46,7 +154,7 @@ class AudioFeatureExtractor:
             except Exception as e2:
                 raise Exception(f"Cannot load audio file: {e2}")
     
-    def extract_basic_features(self, audio: np.ndarray, sr: int) -> Dict[str, float]:
+    def extract_basic_features(self, audio: np.ndarray, sr: int, energy: np.ndarray = None) -> Dict[str, float]:
         """Trích xuất các đặc trưng cơ bản"""
         features = {}
         
@@ -56,7 +164,8 @@ class AudioFeatureExtractor:
         
         # Energy features with error handling
         try:
-            energy = librosa.feature.rms(y=audio, frame_length=2048, hop_length=512)[0]
+            if energy is None:
+                energy = librosa.feature.rms(y=audio, frame_length=self.frame_length, hop_length=self.hop_length)[0]
             features['energy_mean'] = float(np.mean(energy))
             features['energy_std'] = float(np.std(energy))
             features['energy_max'] = float(np.max(energy))
@@ -128,63 +237,115 @@ class AudioFeatureExtractor:
         
         return features
     
-    def detect_pauses_and_speech(self, audio: np.ndarray, sr: int) -> Dict[str, float]:
+    def detect_speech_regions(self, audio: np.ndarray, sr: int, energy: np.ndarray = None) -> Dict[str, Any]:
+        """Phát hiện vùng tiếng nói (VAD) - trả về các đoạn speech/pause theo giây
+        
+        Ngưỡng tính theo dB so với đỉnh (top_db) nhưng không thấp hơn nền nhiễu + biên độ an toàn,
+        nên khoảng lặng dài không kéo ngưỡng xuống mức nhiễu. Khoảng sụt ngắn hơn vad_hangover được
+        giữ là speech, đoạn speech ngắn hơn vad_min_speech bị bỏ.
+        """
+        if energy is None:
+            energy = librosa.feature.rms(y=audio, frame_length=self.frame_length, hop_length=self.hop_length)[0]
+        
+        total_time = len(audio) / sr
+        speech_segments = []
+        pause_segments = []
+        
+        if len(energy) == 0 or np.max(energy) < 1e-4:  # rỗng hoặc im lặng hoàn toàn (< -80 dBFS)
+            if total_time > 0:
+                pause_segments.append((0.0, total_time))
+            return {'speech_segments': speech_segments, 'pause_segments': pause_segments}
+        
+        energy_db = librosa.amplitude_to_db(energy, ref=np.max, top_db=None)
+        noise_floor_db = float(np.percentile(energy_db, 10))
+        threshold_db = max(-self.vad_top_db, noise_floor_db + self.vad_noise_margin_db)
+        threshold_db = min(threshold_db, -self.vad_noise_margin_db)
+        speech_frames = energy_db > threshold_db
+        
+        frame_time = self.hop_length / sr
+        starts, ends = self._frame_runs(speech_frames)
+        
+        # Hangover: nối các khoảng sụt năng lượng ngắn giữa hai đoạn speech
+        hangover_frames = int(round(self.vad_hangover / frame_time))
+        for gap_start, gap_end in zip(ends[:-1], starts[1:]):
+            if gap_end - gap_start <= hangover_frames:
+                speech_frames[gap_start:gap_end] = True
+        starts, ends = self._frame_runs(speech_frames)
+        
+        min_speech_frames = max(1, int(round(self.vad_min_speech / frame_time)))
+        min_pause_duration = 0.1
+        previous_end = 0.0
+        for start, end in zip(starts, ends):
+            if end - start < min_speech_frames:
+                continue
+            start_time = float(start * frame_time)
+            end_time = float(min(end * frame_time, total_time))
+            if start_time - previous_end >= min_pause_duration:
+                pause_segments.append((previous_end, start_time))
+            speech_segments.append((start_time, end_time))
+            previous_end = end_time
+        
+        if total_time - previous_end >= min_pause_duration:
+            pause_segments.append((previous_end, total_time))
+        
+        return {'speech_segments': speech_segments, 'pause_segments': pause_segments}
+    
+    @staticmethod
+    def _frame_runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Chỉ số bắt đầu/kết thúc (không gồm) của các chuỗi frame True liên tiếp"""
+        edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    
+    def prepare_audio(self, file_path: str) -> Dict[str, Any]:
+        """Load audio và chạy VAD một lần; cắt khoảng lặng đầu/cuối cho MFCC, pitch và Whisper"""
+        audio, sr = self.load_audio(file_path)
+        energy = librosa.feature.rms(y=audio, frame_length=self.frame_length, hop_length=self.hop_length)[0]
+        regions = self.detect_speech_regions(audio, sr, energy=energy)
+        speech_segments = regions['speech_segments']
+        
+        trimmed_audio = audio
+        spectral_audio = audio
+        if self.trim_silence and speech_segments:
+            start = max(0, int((speech_segments[0][0] - self.trim_padding) * sr))
+            end = min(len(audio), int((speech_segments[-1][1] + self.trim_padding) * sr))
+            if end > start:
+                trimmed_audio = audio[start:end]
+                spectral_audio = trimmed_audio
+            
+            # Bỏ các khoảng lặng dài bên trong, chỉ dùng cho đặc trưng phổ (MFCC, pitch)
+            if self.skip_long_silences and len(speech_segments) > 1:
+                pieces = []
+                piece_start = speech_segments[0][0]
+                for (_, prev_end), (next_start, _) in zip(speech_segments[:-1], speech_segments[1:]):
+                    if next_start - prev_end > self.max_internal_silence:
+                        pieces.append((piece_start, prev_end))
+                        piece_start = next_start
+                pieces.append((piece_start, speech_segments[-1][1]))
+                if len(pieces) > 1:
+                    spectral_audio = np.concatenate([
+                        audio[max(0, int((s - self.trim_padding) * sr)):min(len(audio), int((e + self.trim_padding) * sr))]
+                        for s, e in pieces
+                    ])
+        
+        return {
+            'audio': audio,
+            'sr': sr,
+            'energy': energy,
+            'speech_segments': speech_segments,
+            'pause_segments': regions['pause_segments'],
+            'trimmed_audio': trimmed_audio,
+            'spectral_audio': spectral_audio,
+        }
+    
+    def detect_pauses_and_speech(self, audio: np.ndarray, sr: int, regions: Dict[str, Any] = None) -> Dict[str, float]:
         """Phát hiện khoảng nghỉ và phân đoạn speech"""
         features = {}
         
         try:
-            frame_length = 2048
-            hop_length = 512
-            
-            energy = librosa.feature.rms(y=audio, frame_length=frame_length, hop_length=hop_length)[0]
-            
-            if len(energy) == 0:
-                features.update({
-                    'dur_mean': 0, 'dur_std': 0, 'dur_median': 0,
-                    'dur_max': 0, 'dur_min': 0, 'number_utt': 0,
-                    'sildur_mean': 0, 'sildur_std': 0, 'sildur_median': 0,
-                    'sildur_max': 0, 'sildur_min': 0, 'speech_rate': 0
-                })
-                return features
-            
-            energy_sorted = np.sort(energy)
-            threshold_idx = max(1, int(len(energy_sorted) * 0.3))
-            energy_threshold = energy_sorted[threshold_idx]
-            
-            speech_frames = energy > energy_threshold
-            frame_times = librosa.frames_to_time(range(len(speech_frames)), sr=sr, hop_length=hop_length)
-            
-            speech_segments = []
-            pause_segments = []
-            
-            in_speech = False
-            current_start = 0
-            min_segment_duration = 0.1
-            
-            for i, is_speech in enumerate(speech_frames):
-                current_time = frame_times[i] if i < len(frame_times) else frame_times[-1]
-                
-                if is_speech and not in_speech:
-                    if i > 0:
-                        segment_duration = current_time - current_start
-                        if segment_duration >= min_segment_duration:
-                            pause_segments.append((current_start, current_time))
-                    current_start = current_time
-                    in_speech = True
-                elif not is_speech and in_speech:
-                    segment_duration = current_time - current_start
-                    if segment_duration >= min_segment_duration:
-                        speech_segments.append((current_start, current_time))
-                    current_start = current_time
-                    in_speech = False
-            
-            final_time = len(audio) / sr
-            if in_speech:
-                if final_time - current_start >= min_segment_duration:
-                    speech_segments.append((current_start, final_time))
-            else:
-                if final_time - current_start >= min_segment_duration:
-                    pause_segments.append((current_start, final_time))
+            if regions is None:
+                regions = self.detect_speech_regions(audio, sr)
+            speech_segments = regions['speech_segments']
+            pause_segments = regions['pause_segments']
             
             speech_durations = [end - start for start, end in speech_segments]
             pause_durations = [end - start for start, end in pause_segments 
@@ -232,20 +393,27 @@ class AudioFeatureExtractor:
             
         return features
     
-    def extract_all_features(self, file_path: str, participant_info: Dict = None) -> Dict[str, Any]:
-        """Trích xuất tất cả đặc trưng từ file âm thanh"""
+    def extract_all_features(self, file_path: str, participant_info: Dict = None,
+                             prepared_audio: Dict[str, Any] = None, feature_groups=None) -> Dict[str, Any]:
+        """Trích xuất các nhóm đặc trưng được chọn (mặc định theo cấu hình) từ file âm thanh"""
         try:
-            audio, sr = self.load_audio(file_path)
+            groups = self.resolve_feature_groups(feature_groups)
+            if prepared_audio is None:
+                prepared_audio = self.prepare_audio(file_path)
+            audio, sr = prepared_audio['audio'], prepared_audio['sr']
             features = {}
             
             if participant_info:
                 features.update(participant_info)
             
             features['filename'] = os.path.basename(file_path)
-            features.update(self.extract_basic_features(audio, sr))
-            features.update(self.extract_pitch_features(audio, sr))
-            features.update(self.extract_mfcc_features(audio, sr))
-            features.update(self.detect_pauses_and_speech(audio, sr))
+            features['duration_total'] = len(audio) / sr
+            features['duration_trimmed'] = len(prepared_audio['trimmed_audio']) / sr
+            for name in groups:
+                compute = FEATURE_GROUPS[name]['compute']
+                if compute is not None:
+                    features.update(compute(self, prepared_audio))
+            features['feature_groups'] = groups
             
             return features
             
@@ -316,31 +484,200 @@ class TextAnalyzer:
             "overall_score": float(overall_score)
         }
 
+# ========================== BATCH TEXT ANALYTICS ==========================
+# Token tiếng Việt: âm tiết chữ (kể cả dấu, "-"), hoặc số; chuẩn hoá NFC trước khi tách
+VIETNAMESE_TOKEN_PATTERN = re.compile(r"[^\W\d_]+(?:[-'][^\W\d_]+)*|\d+(?:[.,]\d+)*")
+SENTENCE_END_PATTERN = re.compile(r"[.!?…]+(?=\s|$)")  # "3.5" không phải hết câu
+
+# Vị trí dấu kiểu cũ -> kiểu mới (hòa -> hoà) để cùng một từ không bị đếm thành hai
+VIETNAMESE_TONE_VARIANTS = {
+    'òa': 'oà', 'óa': 'oá', 'ỏa': 'oả', 'õa': 'oã', 'ọa': 'oạ',
+    'òe': 'oè', 'óe': 'oé', 'ỏe': 'oẻ', 'õe': 'oẽ', 'ọe': 'oẹ',
+    'ùy': 'uỳ', 'úy': 'uý', 'ủy': 'uỷ', 'ũy': 'uỹ', 'ụy': 'uỵ',
+}
+VIETNAMESE_TONE_PATTERN = re.compile('|'.join(VIETNAMESE_TONE_VARIANTS))
+
+# Cùng tên chỉ số và công thức điểm với basic_text_analysis nhưng giá trị có thể lệch: basic tách theo
+# khoảng trắng (dấu câu dính vào từ, "hòa" != "hoà") và đếm từng ký tự '.!?' ("..." = 3, "3.5" = 1).
+# Cohort và score_against_cohort cùng dùng analyze_batch -> không so percentile với text_analysis của /assess.
+class BatchTextAnalyzer:
+    """Phân tích hàng loạt kho transcript, xuất kết quả dạng cột (NumPy / Parquet)"""
+    
+    METRICS = (
+        'word_count', 'unique_words', 'repetition_rate', 'sentence_count',
+        'avg_words_per_sentence', 'vocabulary_diversity', 'coherence_score',
+        'vocabulary_score', 'syntax_score', 'relevance_score', 'fluency_score', 'overall_score'
+    )
+    
+    def __init__(self, transcript_dir: str = os.path.join('..', 'frontend', 'text-records'),
+                 batch_size: int = 1000):
+        self.transcript_dir = transcript_dir
+        self.batch_size = batch_size
+    
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Tách token tiếng Việt (NFC, chữ thường, bỏ dấu câu, thống nhất vị trí dấu thanh)"""
+        text = unicodedata.normalize('NFC', text).lower()
+        text = VIETNAMESE_TONE_PATTERN.sub(lambda m: VIETNAMESE_TONE_VARIANTS[m.group(0)], text)
+        return VIETNAMESE_TOKEN_PATTERN.findall(text)
+    
+    def iter_transcripts(self):
+        """Đọc lần lượt các file .txt trong kho transcript (không load toàn bộ vào bộ nhớ)"""
+        if not os.path.isdir(self.transcript_dir):
+            return
+        names = sorted(entry.name for entry in os.scandir(self.transcript_dir)
+                       if entry.is_file() and entry.name.endswith('.txt'))
+        for name in names:
+            try:
+                with open(os.path.join(self.transcript_dir, name), 'r', encoding='utf-8') as f:
+                    yield name, f.read()
+            except Exception as e:
+                print(f"Cannot read transcript {name}: {e}")
+    
+    def analyze_batch(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Tính các chỉ số của basic_text_analysis cho cả batch bằng phép đếm vector hoá"""
+        n = len(texts)
+        vocabulary = {}
+        token_ids = []
+        lengths = np.zeros(n, dtype=np.int64)
+        sentence_marks = np.zeros(n, dtype=np.int64)
+        for i, text in enumerate(texts):
+            tokens = self.tokenize(text or '')
+            lengths[i] = len(tokens)
+            token_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+            sentence_marks[i] = len(SENTENCE_END_PATTERN.findall(text or ''))
+        
+        # Số từ khác nhau mỗi văn bản: unique trên cặp (văn bản, token) mã hoá thành một số
+        doc_index = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        keys = np.unique(doc_index * max(1, len(vocabulary)) + np.asarray(token_ids, dtype=np.int64))
+        unique_words = np.bincount(keys // max(1, len(vocabulary)), minlength=n).astype(np.int64)
+        
+        columns = self.score_columns(lengths, unique_words, np.maximum(1, sentence_marks))
+        columns['sentence_count'] = np.where(lengths > 0, columns['sentence_count'], 0)
+        return columns
+    
+    @staticmethod
+    def score_columns(word_count: np.ndarray, unique_words: np.ndarray,
+                      sentence_count: np.ndarray) -> Dict[str, np.ndarray]:
+        """Cùng công thức với TextAnalyzer.basic_text_analysis, áp dụng trên mảng"""
+        has_words = word_count > 0
+        safe_count = np.maximum(word_count, 1)
+        diversity = np.where(has_words, unique_words / safe_count, 0.0)
+        repetition_rate = np.where(has_words, 1 - diversity, 0.0)
+        avg_words = word_count / np.maximum(sentence_count, 1)
+        
+        coherence = np.clip(10 - repetition_rate * 5, 1, 10)
+        vocabulary = np.clip(diversity * 10, 1, 10)
+        syntax = np.clip(avg_words / 2, 1, 10)
+        relevance = np.clip(word_count / 10, 1, 10)
+        fluency = np.clip(10 - repetition_rate * 3, 1, 10)
+        scores = {
+            'coherence_score': coherence, 'vocabulary_score': vocabulary, 'syntax_score': syntax,
+            'relevance_score': relevance, 'fluency_score': fluency,
+        }
+        # Văn bản rỗng: mọi điểm = 1 như basic_text_analysis
+        scores = {name: np.where(has_words, value, 1.0) for name, value in scores.items()}
+        scores['overall_score'] = sum(scores.values()) / 5
+        
+        return {
+            'word_count': word_count.astype(np.int64),
+            'unique_words': unique_words.astype(np.int64),
+            'repetition_rate': repetition_rate.astype(np.float64),
+            'sentence_count': sentence_count.astype(np.int64),
+            'avg_words_per_sentence': np.where(has_words, avg_words, 0.0),
+            'vocabulary_diversity': diversity.astype(np.float64),
+            **scores
+        }
+    
+    def analyze_archive(self) -> Dict[str, np.ndarray]:
+        """Phân tích toàn bộ kho transcript theo từng batch, trả về các cột đã nối"""
+        chunks = []
+        names, texts = [], []
+        for name, text in self.iter_transcripts():
+            names.append(name)
+            texts.append(text)
+            if len(texts) >= self.batch_size:
+                chunks.append((names, self.analyze_batch(texts)))
+                names, texts = [], []
+        if texts:
+            chunks.append((names, self.analyze_batch(texts)))
+        
+        # Không đặt tên cột 'file': trùng tham số đầu của np.savez_compressed
+        columns = {'filename': np.array([name for chunk_names, _ in chunks for name in chunk_names], dtype=str)}
+        for metric in self.METRICS:
+            columns[metric] = np.concatenate([chunk[metric] for _, chunk in chunks]) if chunks else np.zeros(0)
+        return columns
+    
+    @staticmethod
+    def save_columns(columns: Dict[str, np.ndarray], path: str) -> str:
+        """Lưu dạng cột: .parquet (cần pyarrow) hoặc .npz"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            pq.write_table(pa.table({name: pa.array(values) for name, values in columns.items()}), path)
+        else:
+            np.savez_compressed(path, **columns)
+        return path
+    
+    @classmethod
+    def cohort_norms(cls, columns: Dict[str, np.ndarray]) -> Dict[str, Dict[str, Any]]:
+        """Chuẩn của cohort cho từng chỉ số: mean, std và mảng đã sắp xếp để tra percentile"""
+        norms = {}
+        for metric in cls.METRICS:
+            values = np.sort(np.asarray(columns[metric], dtype=np.float64))
+            norms[metric] = {
+                'count': int(len(values)),
+                'mean': float(np.mean(values)) if len(values) else 0.0,
+                'std': float(np.std(values)) if len(values) else 0.0,
+                'sorted': values
+            }
+        return norms
+    
+    def score_against_cohort(self, text: str, norms: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+        """So sánh một transcript mới với chuẩn cohort (z-score, percentile) - O(log n) mỗi chỉ số"""
+        columns = self.analyze_batch([text])
+        comparison = {}
+        for metric in self.METRICS:
+            value = float(columns[metric][0])
+            norm = norms[metric]
+            sorted_values = norm['sorted']
+            percentile = (float(np.searchsorted(sorted_values, value, side='right')) / len(sorted_values) * 100
+                          if len(sorted_values) else 0.0)
+            comparison[metric] = {
+                'value': value,
+                'cohort_mean': norm['mean'],
+                'z_score': (value - norm['mean']) / norm['std'] if norm['std'] > 0 else 0.0,
+                'percentile': percentile
+            }
+        return comparison
+
 # ========================== COGNITIVE ASSESSMENT ==========================
 class CognitiveAssessment:
     """Tổng hợp đánh giá nhận thức với thang điểm 30"""
     
-    def __init__(self, max_score=100):
-        self.audio_extractor = AudioFeatureExtractor()
+    def __init__(self, max_score=100, feature_groups='full'):
+        self.audio_extractor = AudioFeatureExtractor(feature_groups=feature_groups)
         self.text_analyzer = TextAnalyzer()
         self.max_score = max_score
+    
+    def resolve_feature_groups(self, feature_groups=None) -> List[str]:
+        """Nhóm đặc trưng sẽ tính: lựa chọn của caller + các nhóm mà điểm âm học cần"""
+        groups = self.audio_extractor.resolve_feature_groups(feature_groups)
+        scoring = self.audio_extractor.resolve_feature_groups('scoring')
+        return groups + [name for name in scoring if name not in groups]
         
     def assess_audio_file(self, audio_path: str, transcribed_text: str, 
-                         participant_info: Dict = None) -> Dict[str, Any]:
+                         participant_info: Dict = None, prepared_audio: Dict = None,
+                         feature_groups=None) -> Dict[str, Any]:
         """Đánh giá toàn diện một file âm thanh"""
         
         try:
-            audio_features = self.audio_extractor.extract_all_features(audio_path, participant_info)
-            text_analysis = self.text_analyzer.basic_text_analysis(transcribed_text)
-            
-            assessment = {
-                "participant_info": participant_info or {},
-                "audio_features": audio_features,
-                "text_analysis": text_analysis,
-                "combined_assessment": self._combine_assessments(audio_features, text_analysis)
-            }
-            
-            return assessment
+            audio_features = self.audio_extractor.extract_all_features(
+                audio_path, participant_info, prepared_audio,
+                feature_groups=self.resolve_feature_groups(feature_groups)
+            )
+            return self.assess_features(audio_features, transcribed_text, participant_info)
             
         except Exception as e:
             print(f"Assessment error: {e}")
@@ -357,6 +694,18 @@ class CognitiveAssessment:
                 }
             }
     
+    def assess_features(self, audio_features: Dict, transcribed_text: str,
+                        participant_info: Dict = None) -> Dict[str, Any]:
+        """Đánh giá từ đặc trưng âm thanh đã trích xuất sẵn (dùng chung cho upload và streaming)"""
+        text_analysis = self.text_analyzer.basic_text_analysis(transcribed_text)
+        
+        return {
+            "participant_info": participant_info or {},
+            "audio_features": audio_features,
+            "text_analysis": text_analysis,
+            "combined_assessment": self._combine_assessments(audio_features, text_analysis)
+        }
+    
     def _combine_assessments(self, audio_features: Dict, text_analysis: Dict) -> Dict[str, Any]:
         """Kết hợp đánh giá âm thanh và văn bản với thang điểm mới"""
         
@@ -442,16 +791,794 @@ class CognitiveAssessment:
             
         return recommendations
 
+# ========================== TRANSCRIPTION ==========================
+WHISPER_SAMPLE_RATE = 16000
+
+class WhisperBackend:
+    """openai-whisper (PyTorch) - các clip ≤30s được decode chung một batch"""
+    
+    def __init__(self, model_name: str = 'base', language: str = None):
+        import whisper
+        self.whisper = whisper
+        self.model = whisper.load_model(model_name, device='cpu')
+        self.language = language
+    
+    def transcribe_batch(self, audios: List[np.ndarray]) -> List[str]:
+        whisper = self.whisper
+        texts = [None] * len(audios)
+        short = [i for i, audio in enumerate(audios) if len(audio) <= whisper.audio.N_SAMPLES]
+        
+        if short:
+            import torch
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(audios[i]), n_mels=self.model.dims.n_mels)
+                for i in short
+            ])
+            options = whisper.DecodingOptions(language=self.language, without_timestamps=True, fp16=False)
+            results = whisper.decode(self.model, mels, options)
+            for i, res in zip(short, results):
+                texts[i] = res.text
+        
+        # Clip dài hơn một cửa sổ 30s: dùng transcribe đầy đủ
+        for i, audio in enumerate(audios):
+            if texts[i] is None:
+                texts[i] = self.model.transcribe(audio, language=self.language, fp16=False).get('text', '') or ''
+        return texts
+
+class FasterWhisperBackend:
+    """CTranslate2/faster-whisper trên CPU (mặc định int8) - encode/generate theo batch"""
+    
+    def __init__(self, model_name: str = 'base', language: str = None, compute_type: str = 'int8',
+                 cpu_threads: int = 0, beam_size: int = 5):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_name, device='cpu', compute_type=compute_type, cpu_threads=cpu_threads)
+        self.language = language
+        self.beam_size = beam_size
+    
+    def transcribe_batch(self, audios: List[np.ndarray]) -> List[str]:
+        from faster_whisper.audio import pad_or_trim
+        from faster_whisper.tokenizer import Tokenizer
+        
+        texts = [None] * len(audios)
+        n_samples = self.model.feature_extractor.n_samples
+        short = [i for i, audio in enumerate(audios) if len(audio) <= n_samples]
+        
+        if short:
+            features = np.stack([pad_or_trim(self.model.feature_extractor(audios[i])) for i in short])
+            encoder_output = self.model.encode(features)
+            
+            if self.language:
+                languages = [self.language] * len(short)
+            else:
+                detected = self.model.model.detect_language(encoder_output)
+                languages = [res[0][0][2:-2] for res in detected]  # "<|vi|>" -> "vi"
+            
+            tokenizers = {}
+            prompts = []
+            for language in languages:
+                if language not in tokenizers:
+                    tokenizers[language] = Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual,
+                                                     task='transcribe', language=language)
+                tokenizer = tokenizers[language]
+                prompts.append(list(tokenizer.sot_sequence) + [tokenizer.no_timestamps])
+            
+            results = self.model.model.generate(encoder_output, prompts, beam_size=self.beam_size,
+                                                max_length=self.model.max_length, suppress_blank=True)
+            for i, language, res in zip(short, languages, results):
+                texts[i] = tokenizers[language].decode(res.sequences_ids[0])
+        
+        # Clip dài hơn một cửa sổ 30s: dùng transcribe đầy đủ
+        for i, audio in enumerate(audios):
+            if texts[i] is None:
+                segments, _ = self.model.transcribe(audio, language=self.language, beam_size=self.beam_size)
+                texts[i] = ''.join(segment.text for segment in segments)
+        return texts
+
+class FakeTranscriptionBackend:
+    """Backend giả cho load test / CI: không cần model, trả văn bản cố định sau độ trễ mô phỏng"""
+    
+    TEXT = "Hôm nay tôi đi chợ mua rau và cá. Sau đó tôi về nhà nấu cơm cho cả gia đình."
+    
+    def __init__(self, model_name: str = None, language: str = None, latency_ms: float = 200):
+        self.latency = latency_ms / 1000.0
+    
+    def transcribe_batch(self, audios: List[np.ndarray]) -> List[str]:
+        # Một lượt encode/decode cho cả batch, giống backend thật
+        time.sleep(self.latency)
+        return [self.TEXT] * len(audios)
+
+TRANSCRIPTION_BACKENDS = {
+    'whisper': WhisperBackend,
+    'faster-whisper': FasterWhisperBackend,
+    'fake': FakeTranscriptionBackend,
+}
+
+class TranscriptionQueueFull(RuntimeError):
+    """Hàng đợi transcription đã đầy - client nên thử lại sau"""
+
+class TranscriptionTooLong(ValueError):
+    """Một clip cần nhiều cửa sổ 30s hơn giới hạn cho mỗi request"""
+
+class TranscriptionScheduler:
+    """Gom các yêu cầu transcription đang chờ thành micro-batch trong một cửa sổ độ trễ ngắn"""
+    
+    def __init__(self, backend, max_batch_size: int = 8, max_wait_ms: float = 50, timeout: float = 300,
+                 max_queue: int = 64, window_seconds: float = 30.0, max_windows: int = 20):
+        self.backend = backend
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout
+        self.window_samples = int(window_seconds * WHISPER_SAMPLE_RATE)
+        # Giới hạn số cửa sổ đang chờ: quá tải thì từ chối ngay thay vì để hàng đợi phình ra
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        # Giới hạn riêng cho từng clip (~10 phút mặc định), không vượt sức chứa hàng đợi:
+        # clip hợp lệ luôn vào được khi server rảnh, queue.Full chỉ còn nghĩa là tồn đọng thật
+        self.max_windows = max(1, min(int(max_windows), self._queue.maxsize))
+        self._worker = threading.Thread(target=self._run, name='transcription-scheduler', daemon=True)
+        self._worker.start()
+    
+    @property
+    def thread_id(self) -> int:
+        return self._worker.ident
+    
+    def submit(self, audio: np.ndarray, sr: int) -> Future:
+        """Đưa một clip vào hàng đợi; resample 16kHz ngay trong luồng gọi
+        
+        Clip dài hơn 30s được cắt thành nhiều cửa sổ, mỗi cửa sổ vào batch như một clip ngắn,
+        nên một bản ghi dài không chặn worker bằng một lượt transcribe tuần tự.
+        """
+        if sr != WHISPER_SAMPLE_RATE:
+            audio = librosa.resample(audio, orig_sr=sr, target_sr=WHISPER_SAMPLE_RATE)
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        
+        windows = self._split_windows(audio)
+        if len(windows) > self.max_windows:
+            max_seconds = self.max_windows * self.window_samples / WHISPER_SAMPLE_RATE
+            raise TranscriptionTooLong(f"Audio too long to transcribe: {len(audio) / WHISPER_SAMPLE_RATE:.0f}s "
+                                       f"(max {max_seconds:.0f}s)")
+        
+        futures = []
+        try:
+            for window in windows:
+                future = Future()
+                self._queue.put_nowait((window, future))
+                futures.append(future)
+        except queue.Full:
+            # Worker bỏ qua các future đã cancel
+            for future in futures:
+                future.cancel()
+            raise TranscriptionQueueFull(f"Transcription queue is full ({self._queue.maxsize} windows pending)")
+        
+        if len(futures) == 1:
+            return futures[0]
+        return self._join(futures)
+    
+    def transcribe(self, audio: np.ndarray, sr: int) -> str:
+        return self.submit(audio, sr).result(timeout=self.timeout)
+    
+    def _split_windows(self, audio: np.ndarray) -> List[np.ndarray]:
+        windows = []
+        start = 0
+        search = 2 * WHISPER_SAMPLE_RATE
+        frame = 400  # 25ms
+        while len(audio) - start > self.window_samples:
+            end = start + self.window_samples
+            # Cắt tại frame năng lượng thấp nhất trong 2s cuối cửa sổ để không cắt giữa từ
+            tail = audio[end - search:end]
+            energy = librosa.feature.rms(y=tail, frame_length=frame, hop_length=frame, center=False)[0]
+            end = end - search + int(np.argmin(energy)) * frame + frame // 2
+            windows.append(audio[start:end])
+            start = end
+        windows.append(audio[start:])
+        return windows
+    
+    @staticmethod
+    def _join(futures: List[Future]) -> Future:
+        """Future gộp: nối text các cửa sổ theo thứ tự khi tất cả đã xong"""
+        joined = Future()
+        lock = threading.Lock()
+        remaining = [len(futures)]
+        
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            if not joined.set_running_or_notify_cancel():
+                return
+            errors = [f.exception() for f in futures if f.exception() is not None]
+            if errors:
+                joined.set_exception(errors[0])
+            else:
+                joined.set_result(' '.join(t.strip() for t in (f.result() for f in futures) if t and t.strip()))
+        
+        for future in futures:
+            future.add_done_callback(on_done)
+        return joined
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Chờ tối đa max_wait kể từ yêu cầu đầu tiên để giới hạn độ trễ đuôi
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            batch = [(audio, future) for audio, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                texts = self.backend.transcribe_batch([audio for audio, _ in batch])
+                for (_, future), text in zip(batch, texts):
+                    future.set_result(text or '')
+            except Exception as e:
+                print(f"Batch transcription error: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+
+# ========================== STREAMING ASSESSMENT ==========================
+class StreamingAssessmentSession:
+    """Đánh giá tăng dần trong lúc người dùng đang ghi âm (audio đến theo từng chunk)"""
+    
+    def __init__(self, assessor: 'CognitiveAssessment', input_sample_rate: int = None,
+                 transcribe_fn=None, window_seconds: float = 6.0, min_new_frames: int = 8,
+                 feature_groups=None, max_duration: float = None, min_duration: float = 0.5):
+        self.assessor = assessor
+        self.extractor = assessor.audio_extractor
+        self.feature_groups = assessor.resolve_feature_groups(feature_groups)
+        self.sr = self.extractor.sr
+        self.input_sr = int(input_sample_rate or self.sr)
+        if not 8000 <= self.input_sr <= 192000:
+            raise ValueError(f"Unsupported sampleRate: {self.input_sr}")
+        self.max_duration = max_duration
+        self.min_duration = min_duration
+        
+        # Resample theo từng chunk độc lập gây méo ở biên chunk -> dùng bộ lọc giữ trạng thái
+        self._resampler = None
+        if self.input_sr != self.sr:
+            if soxr is None:
+                raise ValueError(f"sampleRate {self.input_sr} requires soxr; send audio at {self.sr} Hz")
+            self._resampler = soxr.ResampleStream(self.input_sr, self.sr, 1, dtype='float32')
+        self.frame_length = self.extractor.frame_length
+        self.hop_length = self.extractor.hop_length
+        self.n_mfcc = 13
+        self.window_seconds = window_seconds
+        self.min_new_frames = min_new_frames
+        self.transcribe_fn = transcribe_fn
+        
+        self._buffer = np.zeros(self.sr * 30, dtype=np.float32)
+        self._length = 0
+        self._next_frame = 0
+        
+        # Đặc trưng theo frame (center=False), tính dần khi có đủ mẫu mới
+        self._energy = []
+        self._zcr = []
+        self._mfcc = []
+        self._pitch = []
+        
+        # Whisper chạy trên các cửa sổ cuộn, tuần tự trong một luồng nền
+        self._executor = ThreadPoolExecutor(max_workers=1) if transcribe_fn else None
+        self._transcripts = []
+        self._transcribed_until = 0
+    
+    @property
+    def duration(self) -> float:
+        return self._length / self.sr
+    
+    def add_chunk(self, samples: np.ndarray):
+        """Nhận một chunk PCM mono (float32) và cập nhật đặc trưng cho các frame mới"""
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.size == 0:
+            return
+        if self.max_duration is not None and self.duration + samples.size / self.input_sr > self.max_duration:
+            raise ValueError(f"Stream exceeds maximum duration of {self.max_duration:g}s")
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples)
+        self._append(samples)
+        self._process_frames()
+        self._schedule_transcription()
+    
+    def partial_transcript(self) -> str:
+        """Transcript của các cửa sổ đã xong (theo thứ tự)"""
+        texts = []
+        for future in self._transcripts:
+            if not future.done():
+                break
+            texts.append(self._future_text(future))
+        return ' '.join(t for t in texts if t)
+    
+    def finalize(self, participant_info: Dict = None, transcribed_text: str = '') -> Tuple[Dict[str, Any], str]:
+        """Kết thúc ghi âm: xử lý phần còn lại và trả về (assessment, transcript)"""
+        if self._resampler is not None:
+            # Xả phần mẫu còn giữ trong bộ lọc resample
+            self._append(self._resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
+            self._resampler = None
+        real_length = self._length
+        
+        # Không đệm 0 cho bản ghi rỗng/quá ngắn: trả lỗi thay vì chấm điểm trên khoảng lặng
+        if real_length < max(self.frame_length, int(self.min_duration * self.sr)):
+            audio_features = self._not_enough_audio(real_length, participant_info)
+            return self.assessor.assess_features(audio_features, transcribed_text, participant_info), transcribed_text
+        
+        if not transcribed_text:
+            self._schedule_transcription(final=True)
+        
+        # Đệm 0 để phần mẫu cuối cùng cũng nằm trong một frame
+        if real_length < self.frame_length:
+            padded_length = self.frame_length
+        else:
+            n_frames = int(np.ceil((real_length - self.frame_length) / self.hop_length)) + 1
+            padded_length = (n_frames - 1) * self.hop_length + self.frame_length
+        if padded_length > real_length:
+            self._append(np.zeros(padded_length - real_length, dtype=np.float32))
+        self._process_frames(final=True)
+        self._length = real_length
+        
+        audio_features = self._aggregate_features(self._buffer[:real_length], participant_info)
+        
+        if not transcribed_text:
+            transcribed_text = ' '.join(
+                t for t in (self._future_text(f) for f in self._transcripts) if t
+            )
+        
+        result = self.assessor.assess_features(audio_features, transcribed_text, participant_info)
+        return result, transcribed_text
+    
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+    
+    def _append(self, samples: np.ndarray):
+        needed = self._length + len(samples)
+        if needed > len(self._buffer):
+            grown = np.zeros(max(needed, len(self._buffer) * 2), dtype=np.float32)
+            grown[:self._length] = self._buffer[:self._length]
+            self._buffer = grown
+        self._buffer[self._length:needed] = samples
+        self._length = needed
+    
+    def _process_frames(self, final: bool = False):
+        if self._length < self.frame_length:
+            return
+        available = 1 + (self._length - self.frame_length) // self.hop_length
+        new_frames = available - self._next_frame
+        if new_frames <= 0 or (new_frames < self.min_new_frames and not final):
+            return
+        
+        start = self._next_frame * self.hop_length
+        end = (available - 1) * self.hop_length + self.frame_length
+        segment = self._buffer[start:end]
+        sr, n_fft, hop = self.sr, self.frame_length, self.hop_length
+        
+        try:
+            self._energy.append(librosa.feature.rms(y=segment, frame_length=n_fft, hop_length=hop, center=False)[0])
+            if 'basic' in self.feature_groups:
+                self._zcr.append(librosa.feature.zero_crossing_rate(segment, frame_length=n_fft, hop_length=hop,
+                                                                    center=False)[0])
+            if 'mfcc' in self.feature_groups:
+                self._mfcc.append(librosa.feature.mfcc(y=segment, sr=sr, n_mfcc=self.n_mfcc, n_fft=n_fft,
+                                                       hop_length=hop, center=False))
+            if 'pitch' in self.feature_groups:
+                pitches, magnitudes = librosa.piptrack(y=segment, sr=sr, threshold=0.05, fmin=50, fmax=400,
+                                                       n_fft=n_fft, hop_length=hop, center=False)
+                frame_pitch = pitches[magnitudes.argmax(axis=0), np.arange(pitches.shape[1])]
+                frame_pitch[magnitudes.max(axis=0) <= 0] = 0
+                self._pitch.append(frame_pitch)
+        except Exception as e:
+            print(f"Streaming feature error: {e}")
+        
+        self._next_frame = available
+    
+    def _schedule_transcription(self, final: bool = False):
+        if self._executor is None:
+            return
+        pending = self._length - self._transcribed_until
+        window = int(self.window_seconds * self.sr)
+        if pending <= 0 or (pending < window and not final):
+            return
+        
+        end = self._length
+        if not final and self._energy:
+            # Cắt tại frame năng lượng thấp nhất trong 1.5s cuối để không cắt giữa từ
+            energy = np.concatenate(self._energy)
+            first = max(self._transcribed_until + window // 2, end - int(1.5 * self.sr)) // self.hop_length
+            last = min(len(energy), self._next_frame)
+            if last > first:
+                quietest = first + int(np.argmin(energy[first:last]))
+                end = quietest * self.hop_length + self.frame_length // 2
+        
+        audio = self._buffer[self._transcribed_until:end].copy()
+        self._transcribed_until = end
+        if len(audio) > 0 and np.max(np.abs(audio)) > 1e-3:
+            self._transcripts.append(self._executor.submit(self.transcribe_fn, audio, self.sr))
+    
+    @staticmethod
+    def _future_text(future) -> str:
+        try:
+            return (future.result() or '').strip()
+        except Exception as e:
+            print(f"Streaming transcription error: {e}")
+            return ''
+    
+    def _spectral_mask(self, regions: Dict[str, Any], n_frames: int) -> np.ndarray:
+        """Các frame dùng cho MFCC/pitch - bỏ khoảng lặng đầu/cuối như prepare_audio"""
+        mask = np.ones(n_frames, dtype=bool)
+        speech_segments = regions['speech_segments']
+        if not self.extractor.trim_silence or not speech_segments:
+            return mask
+        
+        frame_times = np.arange(n_frames) * self.hop_length / self.sr
+        padding = self.extractor.trim_padding
+        mask &= (frame_times >= speech_segments[0][0] - padding) & (frame_times < speech_segments[-1][1] + padding)
+        if self.extractor.skip_long_silences:
+            for (_, prev_end), (next_start, _) in zip(speech_segments[:-1], speech_segments[1:]):
+                if next_start - prev_end > self.extractor.max_internal_silence:
+                    mask &= ~((frame_times >= prev_end + padding) & (frame_times < next_start - padding))
+        return mask
+    
+    def _not_enough_audio(self, n_samples: int, participant_info: Dict = None) -> Dict[str, Any]:
+        features = dict(participant_info or {})
+        features.update({
+            'filename': 'stream',
+            'duration_total': n_samples / self.sr,
+            'energy_mean': 0,
+            'speech_rate': 0,
+            'number_utt': 0,
+            'error': 'Not enough audio received'
+        })
+        return features
+    
+    def _aggregate_features(self, audio: np.ndarray, participant_info: Dict = None) -> Dict[str, Any]:
+        features = {}
+        if participant_info:
+            features.update(participant_info)
+        features['filename'] = 'stream'
+        groups = self.feature_groups
+        
+        # Chỉ các nhóm được chọn mới có dữ liệu theo frame; energy (VAD) luôn có
+        tracks = [self._energy]
+        if 'basic' in groups:
+            tracks.append(self._zcr)
+        if 'pitch' in groups:
+            tracks.append(self._pitch)
+        if 'mfcc' in groups:
+            tracks.append([m[0] for m in self._mfcc])
+        n_frames = min(sum(len(e) for e in track) for track in tracks)
+        if n_frames == 0:
+            return self._not_enough_audio(len(audio), participant_info)
+        
+        energy = np.concatenate(self._energy)[:n_frames]
+        regions = self.extractor.detect_speech_regions(audio, self.sr, energy=energy)
+        mask = self._spectral_mask(regions, n_frames)
+        if not mask.any():
+            mask[:] = True
+        
+        features['duration_total'] = len(audio) / self.sr
+        features['duration_trimmed'] = float(np.count_nonzero(mask) * self.hop_length / self.sr)
+        
+        if 'basic' in groups:
+            zcr = np.concatenate(self._zcr)[:n_frames]
+            features['energy_mean'] = float(np.mean(energy))
+            features['energy_std'] = float(np.std(energy))
+            features['energy_max'] = float(np.max(energy))
+            features['energy_min'] = float(np.min(energy))
+            features['zcr_mean'] = float(np.mean(zcr))
+            features['zcr_std'] = float(np.std(zcr))
+        
+        if 'pitch' in groups:
+            pitch_values = np.concatenate(self._pitch)[:n_frames][mask][:1000]
+            pitch_values = pitch_values[(pitch_values > 50) & (pitch_values < 400)]
+            if len(pitch_values) > 5:
+                features['pitch_mean'] = float(np.mean(pitch_values))
+                features['pitch_std'] = float(np.std(pitch_values))
+                features['pitch_max'] = float(np.max(pitch_values))
+                features['pitch_min'] = float(np.min(pitch_values))
+                features['pitch_range'] = features['pitch_max'] - features['pitch_min']
+            else:
+                features.update({
+                    'pitch_mean': 150, 'pitch_std': 0, 'pitch_max': 150, 
+                    'pitch_min': 150, 'pitch_range': 0
+                })
+        
+        if 'mfcc' in groups:
+            spectral_mfcc = np.concatenate(self._mfcc, axis=1)[:, :n_frames][:, mask]
+            for i in range(self.n_mfcc):
+                features[f'mfcc_{i+1}_mean'] = float(np.mean(spectral_mfcc[i]))
+                features[f'mfcc_{i+1}_std'] = float(np.std(spectral_mfcc[i]))
+        
+        if 'pauses' in groups:
+            features.update(self.extractor.detect_pauses_and_speech(audio, self.sr, regions=regions))
+        features['feature_groups'] = groups
+        return features
+
+# ========================== USER TRENDS ==========================
+class UserTrendStore:
+    """Tổng hợp dọc theo từng người dùng, cập nhật tăng dần mỗi lần lưu kết quả"""
+    
+    METRICS = ('combined_score', 'speech_rate', 'sildur_mean', 'pitch_std')
+    
+    def __init__(self, directory: str = os.path.join('results', 'users'), history_size: int = 10):
+        self.directory = directory
+        self.history_size = history_size
+        self._lock = threading.Lock()
+    
+    def _path(self, user_id: str) -> str:
+        # Băm userId: thay ký tự đặc biệt bằng '_' làm "a.b" và "a_b" trùng file (userId gốc nằm trong JSON)
+        key = hashlib.sha256(str(user_id).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+    
+    @contextlib.contextmanager
+    def _locked(self, user_id: str):
+        """Khóa đọc-sửa-ghi: threading.Lock trong process + flock trên file .lock giữa các worker"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f"{self._path(user_id)}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _load(self, user_id: str) -> Dict[str, Any]:
+        path = self._path(user_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def update(self, user_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Cộng dồn một kết quả mới (Welford) - O(1), không đọc lại lịch sử"""
+        combined = result.get('combined_assessment', {})
+        audio_features = result.get('audio_features', {})
+        values = {'combined_score': combined.get('combined_score')}
+        if 'error' not in audio_features:
+            for metric in ('speech_rate', 'sildur_mean', 'pitch_std'):
+                values[metric] = audio_features.get(metric)
+        
+        with self._locked(user_id):
+            aggregate = self._load(user_id) or {
+                'userId': user_id,
+                'count': 0,
+                'metrics': {metric: {'count': 0, 'mean': 0.0, 'm2': 0.0} for metric in self.METRICS},
+                'recent_risk_levels': []
+            }
+            aggregate['count'] += 1
+            
+            for metric, value in values.items():
+                if not isinstance(value, (int, float)) or not np.isfinite(value):
+                    continue
+                running = aggregate['metrics'][metric]
+                running['count'] += 1
+                delta = value - running['mean']
+                running['mean'] += delta / running['count']
+                running['m2'] += delta * (value - running['mean'])
+            
+            aggregate['recent_risk_levels'].append({
+                'timestamp': result.get('timestamp', ''),
+                'risk_level': combined.get('risk_level', 'Unknown'),
+                'combined_score': combined.get('combined_score', 0)
+            })
+            aggregate['recent_risk_levels'] = aggregate['recent_risk_levels'][-self.history_size:]
+            aggregate['last_updated'] = datetime.now().isoformat()
+            
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(user_id)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(aggregate, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        
+        return aggregate
+    
+    def get_trend(self, user_id: str) -> Dict[str, Any]:
+        """Đọc tổng hợp của một người dùng (None nếu chưa có kết quả)"""
+        aggregate = self._load(user_id)
+        if aggregate is None:
+            return None
+        
+        metrics = {}
+        for metric, running in aggregate['metrics'].items():
+            variance = running['m2'] / running['count'] if running['count'] > 0 else 0.0
+            metrics[metric] = {
+                'count': running['count'],
+                'mean': float(running['mean']),
+                'variance': float(variance),
+                'std': float(np.sqrt(variance))
+            }
+        
+        return {
+            'userId': aggregate['userId'],
+            'count': aggregate['count'],
+            'metrics': metrics,
+            'recent_risk_levels': aggregate['recent_risk_levels'],
+            'last_updated': aggregate.get('last_updated', '')
+        }
+
+# ========================== REQUEST PROFILING ==========================
+class SamplingProfiler:
+    """Profiler lấy mẫu stack của một luồng, xuất collapsed stacks (flamegraph.pl / speedscope)"""
+    
+    def __init__(self, thread_id: int = None, interval_ms: float = 5.0):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval_ms / 1000.0
+        self.samples = collections.Counter()
+        self._labels = {}
+        # Luồng được lấy mẫu -> nhãn gốc của stack (None cho luồng request)
+        self._threads = {self.thread_id: None}
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    @contextlib.contextmanager
+    def watching(self, thread_id: int, label: str):
+        """Lấy mẫu thêm một luồng khác (vd. worker transcription) trong lúc request chờ nó"""
+        self._threads[thread_id] = label
+        try:
+            yield
+        finally:
+            self._threads.pop(thread_id, None)
+    
+    def _label(self, frame) -> str:
+        # "librosa.feature.spectral:mfcc" - module + tên hàm, cache theo code object
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get('__name__', os.path.basename(code.co_filename))
+            label = f"{module}:{getattr(code, 'co_qualname', code.co_name)}".replace(';', ',').replace(' ', '_')
+            self._labels[code] = label
+        return label
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id not in frames:
+                break
+            for thread_id, root in list(self._threads.items()):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame))
+                    frame = frame.f_back
+                if root:
+                    stack.append(root)
+                self.samples[';'.join(reversed(stack))] += 1
+    
+    def write_collapsed(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+# Bật bằng header X-Profile (phải khớp PROFILE_ADMIN_TOKEN) hoặc lấy mẫu ngẫu nhiên PROFILE_SAMPLE_RATE
+PROFILE_ADMIN_TOKEN = os.getenv('PROFILE_ADMIN_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+
+def _should_profile() -> bool:
+    if not PROFILE_ADMIN_TOKEN and PROFILE_SAMPLE_RATE <= 0:
+        return False
+    header = request.headers.get('X-Profile')
+    if header and PROFILE_ADMIN_TOKEN and hmac.compare_digest(header.encode('utf-8'), PROFILE_ADMIN_TOKEN.encode('utf-8')):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def profiled_request(view):
+    """Profile một request khi được bật; lưu file .folded cạnh file kết quả"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _should_profile():
+            return view(*args, **kwargs)
+        
+        with SamplingProfiler(interval_ms=PROFILE_INTERVAL_MS) as profiler:
+            g.profiler = profiler
+            response = make_response(view(*args, **kwargs))
+        
+        try:
+            result_file = g.get('result_file')
+            if result_file:
+                profile_file = os.path.splitext(result_file)[0] + '.folded'
+            else:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                profile_file = os.path.join('results', 'profiles', f"{request.endpoint}_{timestamp}.folded")
+            profiler.write_collapsed(profile_file)
+            response.headers['X-Profile-File'] = profile_file
+            print(f"Profile saved: {profile_file} ({sum(profiler.samples.values())} samples)")
+        except Exception as e:
+            print(f"Cannot save profile: {e}")
+        return response
+    return wrapper
+
 # ========================== FLASK APP ==========================
 
 # Global assessor instance
 assessor = None
 
-def initialize_system(max_score=100):
+# Tổng hợp theo người dùng, cập nhật mỗi lần save_result
+user_trends = UserTrendStore()
+ANONYMOUS_USER_ID = 'unknown_user'
+
+# Phân tích hàng loạt transcript; chuẩn cohort được cache sau lần build/đọc đầu tiên
+TEXT_COHORT_FILE = os.path.join('results', 'text_cohort.npz')
+batch_text_analyzer = BatchTextAnalyzer()
+text_cohort_norms = None
+
+# Transcription dùng chung: model load một lần, các request được gom micro-batch
+# Cấu hình: TRANSCRIBE_BACKEND (whisper | faster-whisper | fake), WHISPER_MODEL, WHISPER_LANGUAGE,
+# WHISPER_COMPUTE_TYPE, TRANSCRIBE_MAX_BATCH, TRANSCRIBE_MAX_WAIT_MS, TRANSCRIBE_MAX_QUEUE,
+# TRANSCRIBE_MAX_WINDOWS (số cửa sổ 30s tối đa mỗi clip), FAKE_TRANSCRIBE_LATENCY_MS
+transcription_scheduler = None
+transcription_lock = threading.Lock()
+
+def get_transcription_scheduler() -> TranscriptionScheduler:
+    """Khởi tạo (lazy) backend + scheduler theo biến môi trường"""
+    global transcription_scheduler
+    with transcription_lock:
+        if transcription_scheduler is None:
+            backend_name = os.getenv('TRANSCRIBE_BACKEND', 'whisper')
+            if backend_name not in TRANSCRIPTION_BACKENDS:
+                raise ValueError(f"Unknown transcription backend: {backend_name}")
+            backend_kwargs = {
+                'model_name': os.getenv('WHISPER_MODEL', 'base'),
+                'language': os.getenv('WHISPER_LANGUAGE') or None,
+            }
+            if backend_name == 'faster-whisper':
+                backend_kwargs['compute_type'] = os.getenv('WHISPER_COMPUTE_TYPE', 'int8')
+            elif backend_name == 'fake':
+                backend_kwargs['latency_ms'] = float(os.getenv('FAKE_TRANSCRIBE_LATENCY_MS', 200))
+            transcription_scheduler = TranscriptionScheduler(
+                TRANSCRIPTION_BACKENDS[backend_name](**backend_kwargs),
+                max_batch_size=int(os.getenv('TRANSCRIBE_MAX_BATCH', 8)),
+                max_wait_ms=float(os.getenv('TRANSCRIBE_MAX_WAIT_MS', 50)),
+                max_queue=int(os.getenv('TRANSCRIBE_MAX_QUEUE', 64)),
+                max_windows=int(os.getenv('TRANSCRIBE_MAX_WINDOWS', 20))
+            )
+            print(f"Transcription backend: {backend_name} ({backend_kwargs['model_name']})")
+    return transcription_scheduler
+
+def transcribe_audio(audio: np.ndarray, sr: int) -> str:
+    """Chuyển giọng nói thành văn bản từ tín hiệu đã cắt khoảng lặng"""
+    scheduler = get_transcription_scheduler()
+    profiler = g.get('profiler') if has_request_context() else None
+    if profiler is None:
+        return scheduler.transcribe(audio, sr)
+    # Whisper chạy trong luồng scheduler: lấy mẫu cả luồng đó khi request đang chờ
+    # (batch có thể chứa clip của request khác)
+    with profiler.watching(scheduler.thread_id, 'transcription-scheduler[shared-batch]'):
+        return scheduler.transcribe(audio, sr)
+
+def initialize_system(max_score=100, feature_groups='full'):
     """Khởi tạo hệ thống đánh giá"""
     global assessor
-    assessor = CognitiveAssessment(max_score=max_score)
-    print(f"Cognitive Assessment System initialized with max score: {max_score}")
+    assessor = CognitiveAssessment(max_score=max_score, feature_groups=feature_groups)
+    print(f"Cognitive Assessment System initialized with max score: {max_score}, "
+          f"features: {', '.join(assessor.resolve_feature_groups())}")
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -469,13 +1596,21 @@ def initialize():
     try:
         data = request.get_json() if request.is_json else {}
         max_score = data.get('max_score', 100) if data else 100
+        feature_groups = data.get('features', 'full') if data else 'full'
         
-        initialize_system(max_score)
+        try:
+            initialize_system(max_score, feature_groups)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
         return jsonify({
             'success': True,
             'message': f'System initialized with max score: {max_score}',
             'max_score': max_score,
+            'features': assessor.resolve_feature_groups(),
             'timestamp': datetime.now().isoformat()
         })
         
@@ -486,7 +1621,21 @@ def initialize():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/features', methods=['GET'])
+def get_feature_groups():
+    """Danh sách nhóm đặc trưng, phụ thuộc, chi phí và các profile có sẵn"""
+    return jsonify({
+        'success': True,
+        'groups': {
+            name: {'depends': spec['depends'], 'inputs': spec['inputs'], 'cost': spec['cost']}
+            for name, spec in FEATURE_GROUPS.items()
+        },
+        'profiles': FEATURE_PROFILES,
+        'default': assessor.resolve_feature_groups() if assessor else FEATURE_PROFILES['full']
+    })
+
 @app.route('/assess-file', methods=['POST'])
+@profiled_request
 def assess_file():
     """API endpoint để thực hiện đánh giá với file upload"""
     try:
@@ -509,70 +1658,55 @@ def assess_file():
         gender = request.form.get('gender', '')
      
         transcribed_text = request.form.get('transcribedText', '')
-        user_id = request.form.get('userId', 'unknown_user')
+        user_id = request.form.get('userId', ANONYMOUS_USER_ID)
         question = request.form.get('question', '')
         question_id = request.form.get('questionId', '')
         
+        # Nhóm đặc trưng cần tính (profile "full" / "scoring" hoặc danh sách "pitch,pauses")
+        try:
+            feature_groups = assessor.resolve_feature_groups(request.form.get('features'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         # Lưu file tạm thời
         with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
             audio_file.save(tmp_file.name)
             audio_path = tmp_file.name
         
         try:
+            # Load audio + VAD một lần, dùng chung cho Whisper và trích xuất đặc trưng
+            prepared_audio = None
+            try:
+                prepared_audio = assessor.audio_extractor.prepare_audio(audio_path)
+            except Exception as e:
+                print(f"Audio preparation failed: {e}")
+            
             # Auto transcribe nếu chưa có transcribed_text
             if not transcribed_text or transcribed_text.strip() == '':
                 try:
-                    import whisper
-                    model = whisper.load_model("base")
-                    wres = model.transcribe(audio_path)
-                    transcribed_text = wres.get('text', '') or ''
+                    transcribed_text = transcribe_audio(prepared_audio['trimmed_audio'], prepared_audio['sr']) if prepared_audio else ''
+                except TranscriptionQueueFull as e:
+                    return jsonify({
+                        'success': False,
+                        'error': str(e),
+                        'timestamp': datetime.now().isoformat()
+                    }), 503
+                except TranscriptionTooLong as e:
+                    return jsonify({
+                        'success': False,
+                        'error': str(e),
+                        'timestamp': datetime.now().isoformat()
+                    }), 413
                 except Exception as e:
                     transcribed_text = ''
             
             # Lưu transcript ra frontend/text-records với tên user-question
-            try:
-                transcript_dir = os.path.join('..', 'frontend', 'text-records')
-                os.makedirs(transcript_dir, exist_ok=True)
-                safe_user = user_id.replace('@', '_').replace('.', '_')
-                safe_qid = f"q{question_id}" if question_id else ""
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                base_name = f"{safe_user}_{safe_qid}_{timestamp}" if safe_qid else f"{safe_user}_{timestamp}"
-                txt_filename = os.path.join(transcript_dir, f"{base_name}.txt")
-                with open(txt_filename, 'w', encoding='utf-8') as ftxt:
-                    ftxt.write(transcribed_text)
-                print(f"Transcript saved: {os.path.abspath(txt_filename)}")
-            except Exception as e:
-                print(f"Cannot save transcript: {e}")
+            save_transcript(transcribed_text, user_id, question_id)
             
-           
-            gpt_eval = {}
-            try:
-                openai_key = os.getenv('OPENAI_API_KEY')
-                if openai_key and transcribed_text:
-                    client = OpenAI(api_key=openai_key)
-                    template_path = os.path.join('prompts', 'gpt_eval_template.txt')
-                    try:
-                        with open(template_path, 'r', encoding='utf-8') as pf:
-                            prompt = pf.read()
-                        prompt = prompt.replace('{{QUESTION}}', question or '')
-                        prompt = prompt.replace('{{TRANSCRIPT}}', transcribed_text or '')
-                    except Exception:
-                        prompt = f"Câu hỏi: '{question}'. Transcript: '{transcribed_text}'. Hãy chấm điểm JSON theo template đã mô tả."
-                    completion = client.chat.completions.create(
-                        model="o4-mini-2025-04-16", # model ưu tiên
-                        messages=[{"role": "user", "content": prompt}],
-                        temperature=0.2,
-                        max_tokens=256
-                    )
-                    import re, json as pyjson
-                    gpt_text = completion.choices[0].message.content
-                    try:
-                        json_str = re.search(r'\{[\s\S]*\}', gpt_text).group(0)
-                        gpt_eval = pyjson.loads(json_str)
-                    except Exception:
-                        gpt_eval = {}
-            except Exception as e:
-                print(f"GPT evaluation error: {e}")
+            gpt_eval = evaluate_with_gpt(question, transcribed_text)
             
             # Thông tin người tham gia
             participant_info = {
@@ -585,38 +1719,17 @@ def assess_file():
             result = assessor.assess_audio_file(
                 audio_path=audio_path,
                 transcribed_text=transcribed_text,
-                participant_info=participant_info
+                participant_info=participant_info,
+                prepared_audio=prepared_audio,
+                feature_groups=feature_groups
             )
             
             # Gộp kết quả GPT vào text_analysis nếu có
             if gpt_eval:
-                ta = result.get('text_analysis', {})
-                ta['semantic_accuracy'] = float(gpt_eval.get('semantic_accuracy', ta.get('overall_score', 0)))
-                ta['vocabulary_score'] = float(gpt_eval.get('vocabulary_richness', ta.get('vocabulary_score', 0)))
-                ta['repetition_rate'] = float(gpt_eval.get('repetition_rate', ta.get('repetition_rate', 0)))
-                ta['reasoning_quality'] = float(gpt_eval.get('reasoning_quality', 0))
-                ta['detailed_analysis'] = gpt_eval.get('notes', ta.get('detailed_analysis', ''))
-                result['text_analysis'] = ta
-                # Điều chỉnh text_score (0-10) từ semantic/vocab/repetition/reasoning
-                language10 = (
-                    ta.get('semantic_accuracy', 0) +
-                    ta.get('vocabulary_score', ta.get('vocabulary_richness', 0)) +
-                    (10 - (ta.get('repetition_rate', 0) * 10)) +
-                    ta.get('reasoning_quality', 0)
-                ) / 4.0
-                # map sang 0-max_score theo logic combine nội bộ
-                combined = result.get('combined_assessment', {})
-                # giữ nguyên audio_score, thay text_score theo language10 thang max_score
-                max_score = assessor.max_score
-                combined['text_score'] = float((language10 / 10.0) * max_score)
-                # tính lại combined_score với trọng số đã định trong hàm
-                # dùng lại _combine_assessments để đảm bảo nhất quán
-                result['combined_assessment'] = assessor._combine_assessments(
-                    result.get('audio_features', {}), ta
-                )
+                apply_gpt_evaluation(result, gpt_eval)
             
             # Lưu kết quả (bao gồm transcribed_text)
-            save_result(result, participant_info, transcribed_text=transcribed_text)
+            g.result_file = save_result(result, participant_info, transcribed_text=transcribed_text, user_id=user_id)
             
             return jsonify({
                 'success': True,
@@ -638,6 +1751,7 @@ def assess_file():
         }), 500
 
 @app.route('/assess', methods=['POST'])
+@profiled_request
 def assess():
     """API endpoint để thực hiện đánh giá với đường dẫn file"""
     try:
@@ -666,6 +1780,14 @@ def assess():
                 'error': 'audio_path is required'
             }), 400
         
+        try:
+            feature_groups = assessor.resolve_feature_groups(data.get('features'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         # Kiểm tra file có tồn tại không
         if not os.path.exists(audio_path):
             return jsonify({
@@ -677,11 +1799,12 @@ def assess():
         result = assessor.assess_audio_file(
             audio_path=audio_path,
             transcribed_text=transcribed_text,
-            participant_info=participant_info
+            participant_info=participant_info,
+            feature_groups=feature_groups
         )
         
         # Lưu kết quả
-        save_result(result, participant_info)
+        g.result_file = save_result(result, participant_info, user_id=data.get('user_id'))
         
         return jsonify({
             'success': True,
@@ -697,6 +1820,122 @@ def assess():
             'traceback': traceback.format_exc()
         }), 500
 
+# Frontend giới hạn 180s ghi âm; chừa thêm một khoảng cho độ trễ mạng
+STREAM_MAX_SECONDS = float(os.getenv('STREAM_MAX_SECONDS', 200))
+
+def assess_stream(ws):
+    """WebSocket endpoint: đánh giá tăng dần trong lúc đang ghi âm
+    
+    Giao thức:
+      - text  {"type": "start", "sampleRate", "age", "gender", "userId", "question", "questionId"}
+      - binary: PCM mono float32 little-endian theo sampleRate
+      - text  {"type": "stop", "transcribedText"?} -> server trả {"type": "result", ...}
+    """
+    if assessor is None:
+        ws.send(json.dumps({'type': 'error', 'error': 'System not initialized. Call /initialize first.'}))
+        return
+    
+    session = None
+    info = {}
+    last_partial = ''
+    try:
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+            
+            if isinstance(message, (bytes, bytearray)):
+                if session is None:
+                    ws.send(json.dumps({'type': 'error', 'error': 'Send a start message before audio'}))
+                    continue
+                try:
+                    session.add_chunk(np.frombuffer(message, dtype='<f4'))
+                except ValueError as e:
+                    ws.send(json.dumps({'type': 'error', 'error': str(e)}))
+                    ws.close(reason=1009, message='Stream too long')
+                    break
+                partial = session.partial_transcript()
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    ws.send(json.dumps({'type': 'partial', 'transcript': partial,
+                                        'duration': session.duration}, ensure_ascii=False))
+                continue
+            
+            data = json.loads(message)
+            if data.get('type') == 'start':
+                info = data
+                try:
+                    session = StreamingAssessmentSession(
+                        assessor,
+                        input_sample_rate=data.get('sampleRate'),
+                        transcribe_fn=transcribe_audio,
+                        feature_groups=data.get('features'),
+                        max_duration=STREAM_MAX_SECONDS
+                    )
+                except ValueError as e:
+                    # Tương đương 400: tham số start không hợp lệ (features rỗng/không tồn tại, sampleRate)
+                    ws.send(json.dumps({'type': 'error', 'error': str(e)}))
+                    ws.close(reason=1008, message='Invalid start message')
+                    break
+                ws.send(json.dumps({'type': 'ready'}))
+            
+            elif data.get('type') == 'stop':
+                if session is None:
+                    ws.send(json.dumps({'type': 'error', 'error': 'Send a start message before stop'}))
+                    break
+                participant_info = {
+                    'age': int(info.get('age') or 0),
+                    'gender': info.get('gender', ''),
+                }
+                result, transcribed_text = session.finalize(
+                    participant_info, transcribed_text=data.get('transcribedText', '')
+                )
+                # Không đủ audio: báo lỗi, không lưu transcript/kết quả (tránh điểm giả trong trend)
+                if 'error' in result['audio_features']:
+                    ws.send(json.dumps({'type': 'error', 'error': result['audio_features']['error']}))
+                    break
+                # GPT chậm hơn nhiều: gửi kết quả âm học trước (final=False nếu còn bản hiệu chỉnh GPT)
+                gpt_pending = bool(os.getenv('OPENAI_API_KEY') and transcribed_text)
+                ws.send(json.dumps({
+                    'type': 'result',
+                    'success': True,
+                    'final': not gpt_pending,
+                    'data': result,
+                    'transcribed_text': transcribed_text,
+                    'timestamp': datetime.now().isoformat()
+                }, ensure_ascii=False, default=str))
+                
+                save_transcript(transcribed_text, info.get('userId', ANONYMOUS_USER_ID), info.get('questionId', ''))
+                if gpt_pending:
+                    gpt_eval = evaluate_with_gpt(info.get('question', ''), transcribed_text)
+                    if gpt_eval:
+                        apply_gpt_evaluation(result, gpt_eval)
+                    # Luôn gửi bản final (kể cả khi GPT lỗi) để client không phải chờ tới timeout
+                    ws.send(json.dumps({
+                        'type': 'result',
+                        'success': True,
+                        'final': True,
+                        'data': result,
+                        'transcribed_text': transcribed_text,
+                        'timestamp': datetime.now().isoformat()
+                    }, ensure_ascii=False, default=str))
+                save_result(result, participant_info, transcribed_text=transcribed_text,
+                            user_id=info.get('userId', ANONYMOUS_USER_ID))
+                break
+    
+    except Exception as e:
+        print(f"Streaming assessment error: {e}")
+        try:
+            ws.send(json.dumps({'type': 'error', 'error': str(e)}))
+        except Exception:
+            pass
+    finally:
+        if session is not None:
+            session.close()
+
+if sock is not None:
+    assess_stream = sock.route('/assess-stream')(assess_stream)
+
 @app.route('/results', methods=['GET'])
 def get_results():
     """Lấy danh sách kết quả đã lưu"""
@@ -768,24 +2007,192 @@ def get_result_detail(filename):
             'error': str(e)
         }), 500
 
-def save_result(result, participant_info, transcribed_text=''):
-    """Lưu kết quả đánh giá vào file"""
+@app.route('/users/<user_id>/trend', methods=['GET'])
+def get_user_trend(user_id):
+    """Lấy xu hướng dọc của một người dùng (đọc tổng hợp, không quét lại lịch sử)"""
+    try:
+        trend = user_trends.get_trend(user_id)
+        if trend is None:
+            return jsonify({
+                'success': False,
+                'error': 'No results found for this user'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': trend
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/text-analytics/build', methods=['POST'])
+def build_text_cohort():
+    """Phân tích toàn bộ kho transcript và lưu dữ liệu cột + chuẩn cohort"""
+    global text_cohort_norms
+    try:
+        data = request.get_json(silent=True) or {}
+        columns = batch_text_analyzer.analyze_archive()
+        BatchTextAnalyzer.save_columns(columns, TEXT_COHORT_FILE)
+        
+        parquet_file = None
+        if data.get('format') == 'parquet':
+            parquet_file = BatchTextAnalyzer.save_columns(columns, os.path.splitext(TEXT_COHORT_FILE)[0] + '.parquet')
+        
+        text_cohort_norms = BatchTextAnalyzer.cohort_norms(columns)
+        return jsonify({
+            'success': True,
+            'count': int(len(columns['filename'])),
+            'files': [path for path in (TEXT_COHORT_FILE, parquet_file) if path],
+            'norms': {metric: {'mean': norm['mean'], 'std': norm['std']}
+                      for metric, norm in text_cohort_norms.items()}
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/text-analytics/score', methods=['POST'])
+def score_text_against_cohort():
+    """So sánh một transcript mới với chuẩn cohort đã build"""
+    global text_cohort_norms
+    try:
+        data = request.get_json(silent=True) or {}
+        text = data.get('text', '')
+        
+        if text_cohort_norms is None:
+            if not os.path.exists(TEXT_COHORT_FILE):
+                return jsonify({
+                    'success': False,
+                    'error': 'Cohort not built. Call /text-analytics/build first.'
+                }), 404
+            with np.load(TEXT_COHORT_FILE) as cohort:
+                text_cohort_norms = BatchTextAnalyzer.cohort_norms(cohort)
+        
+        return jsonify({
+            'success': True,
+            'data': batch_text_analyzer.score_against_cohort(text, text_cohort_norms)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def save_result(result, participant_info, transcribed_text='', user_id=None):
+    """Lưu kết quả đánh giá vào file và cập nhật tổng hợp theo người dùng"""
     try:
         os.makedirs('results', exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"results/assessment_{timestamp}.json"
+        now = datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        # Tên file là định danh của kết quả (X-Profile-File, .folded cạnh kết quả): thêm µs + uuid để
+        # các request trong cùng một giây / khác worker không ghi đè lên nhau
+        filename = f"results/assessment_{timestamp}_{now.strftime('%f')}_{uuid.uuid4().hex[:8]}.json"
+        
+        participant_info = dict(participant_info or {})
+        if user_id:
+            participant_info['userId'] = user_id
         
         result['timestamp'] = timestamp
         result['participant_info'] = participant_info
         result['transcribed_text'] = transcribed_text # Lưu transcribed_text vào kết quả
         
-        with open(filename, 'w', encoding='utf-8') as f:
+        with open(filename, 'x', encoding='utf-8') as f:
             json.dump(result, f, ensure_ascii=False, indent=2, default=str)
             
         print(f"Result saved: {filename}")
         
+        # Bài nộp ẩn danh (mặc định ANONYMOUS_USER_ID) không thuộc về ai: không gộp vào trend chung
+        if participant_info.get('userId') not in (None, '', ANONYMOUS_USER_ID):
+            user_trends.update(participant_info['userId'], result)
+        
+        return filename
+        
     except Exception as e:
         print(f"Error saving result: {e}")
+        return None
+
+def save_transcript(transcribed_text, user_id, question_id=''):
+    """Lưu transcript ra frontend/text-records với tên user-question"""
+    try:
+        transcript_dir = os.path.join('..', 'frontend', 'text-records')
+        os.makedirs(transcript_dir, exist_ok=True)
+        safe_user = user_id.replace('@', '_').replace('.', '_')
+        safe_qid = f"q{question_id}" if question_id else ""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_name = f"{safe_user}_{safe_qid}_{timestamp}" if safe_qid else f"{safe_user}_{timestamp}"
+        txt_filename = os.path.join(transcript_dir, f"{base_name}.txt")
+        with open(txt_filename, 'w', encoding='utf-8') as ftxt:
+            ftxt.write(transcribed_text)
+        print(f"Transcript saved: {os.path.abspath(txt_filename)}")
+    except Exception as e:
+        print(f"Cannot save transcript: {e}")
+
+def evaluate_with_gpt(question, transcribed_text) -> Dict[str, Any]:
+    """Chấm điểm ngữ nghĩa transcript bằng OpenAI (trả về {} nếu không khả dụng)"""
+    gpt_eval = {}
+    try:
+        openai_key = os.getenv('OPENAI_API_KEY')
+        if openai_key and transcribed_text:
+            client = OpenAI(api_key=openai_key)
+            template_path = os.path.join('prompts', 'gpt_eval_template.txt')
+            try:
+                with open(template_path, 'r', encoding='utf-8') as pf:
+                    prompt = pf.read()
+                prompt = prompt.replace('{{QUESTION}}', question or '')
+                prompt = prompt.replace('{{TRANSCRIPT}}', transcribed_text or '')
+            except Exception:
+                prompt = f"Câu hỏi: '{question}'. Transcript: '{transcribed_text}'. Hãy chấm điểm JSON theo template đã mô tả."
+            completion = client.chat.completions.create(
+                model="o4-mini-2025-04-16", # model ưu tiên
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.2,
+                max_tokens=256
+            )
+            import re, json as pyjson
+            gpt_text = completion.choices[0].message.content
+            try:
+                json_str = re.search(r'\{[\s\S]*\}', gpt_text).group(0)
+                gpt_eval = pyjson.loads(json_str)
+            except Exception:
+                gpt_eval = {}
+    except Exception as e:
+        print(f"GPT evaluation error: {e}")
+    return gpt_eval
+
+def apply_gpt_evaluation(result, gpt_eval):
+    """Gộp kết quả GPT vào text_analysis và tính lại combined_assessment"""
+    ta = result.get('text_analysis', {})
+    ta['semantic_accuracy'] = float(gpt_eval.get('semantic_accuracy', ta.get('overall_score', 0)))
+    ta['vocabulary_score'] = float(gpt_eval.get('vocabulary_richness', ta.get('vocabulary_score', 0)))
+    ta['repetition_rate'] = float(gpt_eval.get('repetition_rate', ta.get('repetition_rate', 0)))
+    ta['reasoning_quality'] = float(gpt_eval.get('reasoning_quality', 0))
+    ta['detailed_analysis'] = gpt_eval.get('notes', ta.get('detailed_analysis', ''))
+    result['text_analysis'] = ta
+    # Điều chỉnh text_score (0-10) từ semantic/vocab/repetition/reasoning
+    language10 = (
+        ta.get('semantic_accuracy', 0) +
+        ta.get('vocabulary_score', ta.get('vocabulary_richness', 0)) +
+        (10 - (ta.get('repetition_rate', 0) * 10)) +
+        ta.get('reasoning_quality', 0)
+    ) / 4.0
+    # map sang 0-max_score theo logic combine nội bộ
+    combined = result.get('combined_assessment', {})
+    # giữ nguyên audio_score, thay text_score theo language10 thang max_score
+    max_score = assessor.max_score
+    combined['text_score'] = float((language10 / 10.0) * max_score)
+    # tính lại combined_score với trọng số đã định trong hàm
+    # dùng lại _combine_assessments để đảm bảo nhất quán
+    result['combined_assessment'] = assessor._combine_assessments(
+        result.get('audio_features', {}), ta
+    )
+    return result
 
 @app.errorhandler(413)
 def too_large(e):
@@ -814,10 +2221,15 @@ if __name__ == '__main__':
     print("📡 Endpoints available:")
     print("  GET  /health          - Health check")
     print("  POST /initialize      - Initialize system with custom max_score")
+    print("  GET  /features        - List feature groups and profiles")
     print("  POST /assess          - Perform assessment (with file path)")
     print("  POST /assess-file     - Perform assessment (with file upload)")
+    print("  WS   /assess-stream   - Streaming assessment while recording")
     print("  GET  /results         - Get all results")
     print("  GET  /results/<file>  - Get specific result details")
+    print("  GET  /users/<id>/trend - Get per-user longitudinal trend")
+    print("  POST /text-analytics/build - Analyze transcript archive, build cohort norms")
+    print("  POST /text-analytics/score - Score a transcript against cohort norms")
     print("")
     print("🌐 Server running on: http://localhost:5001")
     print("🔧 CORS enabled for cross-origin requests")
@@ -200,6 +200,11 @@ export default function MemoryTestPage() {
   // Refs
   const recordingTimerRef = useRef<NodeJS.Timeout | null>(null);
   const currentQuestionRef = useRef(currentQuestionIndex);
+  const streamSocketRef = useRef<WebSocket | null>(null);
+  const streamSentSamplesRef = useRef(0);
+  const streamContextRef = useRef<AudioContext | null>(null);
+  const streamResultRef = useRef<Promise<any | null> | null>(null);
+  const streamLatestRef = useRef<any | null>(null);
   
   // Derived state
   const currentQuestion = questions[currentQuestionIndex];
@@ -478,6 +483,112 @@ const generateGreeting = (data: UserData) => {
     }
   };
 
+  // Gửi PCM lên /assess-stream trong lúc ghi âm để backend phân tích dần
+  const startStreaming = (stream: MediaStream) => {
+    try {
+      const base = process.env.NEXT_PUBLIC_PYTHON_BACKEND_URL || 'http://localhost:5001';
+      const socket = new WebSocket(`${base.replace(/^http/, 'ws')}/assess-stream`);
+      socket.binaryType = 'arraybuffer';
+      const audioContext = new (window.AudioContext || (window as any).webkitAudioContext)();
+      const source = audioContext.createMediaStreamSource(stream);
+      const processor = audioContext.createScriptProcessor(4096, 1, 1);
+
+      processor.onaudioprocess = (e) => {
+        if (socket.readyState === WebSocket.OPEN) {
+          const samples = new Float32Array(e.inputBuffer.getChannelData(0));
+          socket.send(samples.buffer);
+          streamSentSamplesRef.current += samples.length;
+        }
+      };
+      source.connect(processor);
+      processor.connect(audioContext.destination);
+
+      socket.onopen = () => {
+        socket.send(JSON.stringify({
+          type: 'start',
+          sampleRate: audioContext.sampleRate,
+          age: userData?.age,
+          gender: userData?.gender,
+          userId: userData?.email,
+          question: currentQuestion.text.replace('{greeting}', greeting),
+          questionId: currentQuestion.id
+        }));
+      };
+
+      // Kết quả âm học đến ngay khi dừng (final=false nếu còn bản hiệu chỉnh GPT theo sau)
+      streamLatestRef.current = null;
+      streamSentSamplesRef.current = 0;
+      streamResultRef.current = new Promise((resolve) => {
+        socket.onmessage = (event) => {
+          const message = JSON.parse(event.data);
+          if (message.type === 'result') {
+            streamLatestRef.current = message;
+            if (message.final) resolve(message);
+          }
+          if (message.type === 'error') resolve(streamLatestRef.current);
+        };
+        socket.onerror = () => resolve(streamLatestRef.current);
+        socket.onclose = () => resolve(streamLatestRef.current);
+      });
+
+      streamSocketRef.current = socket;
+      streamContextRef.current = audioContext;
+    } catch (error) {
+      console.warn('Streaming assessment unavailable:', error);
+      streamSocketRef.current = null;
+      streamResultRef.current = null;
+    }
+  };
+
+  // captured=false (không ghi được audio / lỗi recorder): đóng socket, không gửi stop để backend không chấm điểm rỗng
+  const finishStreaming = async (captured = true): Promise<any | null> => {
+    const socket = streamSocketRef.current;
+    const resultPromise = streamResultRef.current;
+    streamContextRef.current?.close();
+    streamContextRef.current = null;
+    streamSocketRef.current = null;
+    streamResultRef.current = null;
+    if (!socket || !resultPromise || socket.readyState !== WebSocket.OPEN ||
+        !captured || streamSentSamplesRef.current === 0) {
+      socket?.close();
+      return null;
+    }
+
+    socket.send(JSON.stringify({ type: 'stop' }));
+    // Chờ bản final (có GPT); hết thời gian thì dùng kết quả âm học đã nhận nếu có
+    const timeout = new Promise<any | null>((resolve) => setTimeout(() => resolve(streamLatestRef.current), 20000));
+    const message = await Promise.race([resultPromise, timeout]);
+    socket.close();
+    return message;
+  };
+
+  const applyStreamedResult = (message: any, audioBlob: Blob, filename: string) => {
+    // Chuyển text_analysis của backend sang dạng gpt_analysis mà UI đọc (giống /api/analyze-audio)
+    const textAnalysis = message.data?.text_analysis;
+    const gptAnalysis = textAnalysis ? {
+      repetition_rate: textAnalysis.repetition_rate,
+      vocabulary_score: textAnalysis.vocabulary_score,
+      context_relevance: textAnalysis.semantic_accuracy ?? textAnalysis.relevance_score,
+      reasoning_quality: textAnalysis.reasoning_quality,
+      analysis: textAnalysis.detailed_analysis
+    } : null;
+    const result: TestResult = {
+      questionId: currentQuestion.id,
+      question: currentQuestion.text.replace('{greeting}', greeting),
+      audioBlob,
+      audioFilename: filename,
+      transcription: message.transcribed_text || '',
+      timestamp: new Date(),
+      duration: recordingDuration,
+      gpt_analysis: gptAnalysis,
+      audio_features: message.data?.audio_features || null
+    };
+    setTestResults(prev => {
+      const filtered = prev.filter(r => r.questionId !== currentQuestion.id);
+      return [...filtered, result];
+    });
+  };
+
   const startRecording = async () => {
     try {
       stopTTS();
@@ -523,6 +634,8 @@ const generateGreeting = (data: UserData) => {
       };
       
       recorder.onstop = async () => {
+        const streamedResult = finishStreaming(chunks.length > 0);
+        
         if (chunks.length === 0) {
           console.error('No audio data recorded');
           alert('Không có dữ liệu âm thanh được ghi lại. Vui lòng thử lại.');
@@ -552,9 +665,15 @@ const generateGreeting = (data: UserData) => {
         const url = URL.createObjectURL(audioBlob);
         setAudioUrl(url);
         
+        // Kết quả streaming có sẵn ngay khi dừng; chỉ upload để phân tích lại nếu streaming lỗi
+        const streamed = await streamedResult;
+        if (streamed) {
+          applyStreamedResult(streamed, audioBlob, filename);
+        }
+        
         const [fileSaved] = await Promise.all([
           saveAudioFile(audioBlob, filename),
-          analyzeAudio(audioBlob, filename)
+          streamed ? Promise.resolve() : analyzeAudio(audioBlob, filename)
         ]);
         
         if (!fileSaved) {
@@ -572,6 +691,7 @@ const generateGreeting = (data: UserData) => {
       recorder.onerror = (e) => {
         console.error('MediaRecorder error:', e);
         alert('Lỗi trong quá trình ghi âm. Vui lòng thử lại.');
+        finishStreaming(false);
         stream.getTracks().forEach(track => track.stop());
         if (recordingTimerRef.current) {
           clearInterval(recordingTimerRef.current);
@@ -581,6 +701,7 @@ const generateGreeting = (data: UserData) => {
       };
 
       setMediaRecorder(recorder);
+      startStreaming(stream);
       recorder.start(250);
       setIsRecording(true);
       setHasRecording(false);
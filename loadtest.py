@@ -0,0 +1,444 @@
+"""Load test end-to-end cho /assess-file
+
+Khởi động Flask app (dev server hoặc gunicorn) cùng một server OpenAI giả lập chạy local và
+backend transcription giả (hoặc Whisper "tiny"), sau đó gửi đồng thời các file âm thanh tổng hợp
+và báo cáo throughput, độ trễ p50/p95/p99, tỉ lệ lỗi và bộ nhớ đỉnh của từng worker.
+
+Ví dụ:
+    python loadtest.py --concurrency 8 --requests 200 --mix short=0.6,medium=0.3,long=0.1
+    python loadtest.py --server gunicorn --workers 4 --duration 60 --json report.json --max-p95-ms 3000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_RATE = 22050
+
+# Độ dài (giây) của các loại bản ghi tổng hợp
+AUDIO_PROFILES = {
+    'short': 5,
+    'medium': 20,
+    'long': 60,
+}
+
+# ========================== STUB OPENAI ==========================
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Trả lời /v1/chat/completions theo định dạng OpenAI với một kết quả chấm điểm cố định"""
+
+    latency = 0.3
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        time.sleep(self.latency)
+        evaluation = {
+            'semantic_accuracy': 7,
+            'vocabulary_richness': 6,
+            'repetition_rate': 0.1,
+            'reasoning_quality': 7,
+            'notes': 'stub evaluation'
+        }
+        body = json.dumps({
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': 'stub',
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': json.dumps(evaluation)},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_openai(latency_ms: float) -> ThreadingHTTPServer:
+    StubOpenAIHandler.latency = latency_ms / 1000.0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ========================== SYNTHETIC AUDIO ==========================
+def synthesize_recording(duration: float, seed: int) -> bytes:
+    """WAV mono 16-bit: các đoạn "nói" (hài âm có vibrato) xen khoảng nghỉ, có lặng đầu/cuối"""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(duration * SAMPLE_RATE), dtype=np.float32)
+    position = rng.uniform(0.5, 1.5)
+    end = duration - rng.uniform(0.5, 1.5)
+
+    while position < end:
+        length = min(rng.uniform(0.4, 2.0), end - position)
+        t = np.arange(int(length * SAMPLE_RATE)) / SAMPLE_RATE
+        f0 = rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * rng.uniform(3, 6) * t))
+        phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+        envelope = np.minimum(1, np.minimum(t, t[-1] - t) * 20)
+        start = int(position * SAMPLE_RATE)
+        audio[start:start + len(t)] += (0.3 * voiced * envelope).astype(np.float32)
+        position += length + rng.uniform(0.2, 2.5)
+
+    audio += rng.normal(0, 0.002, len(audio)).astype(np.float32)
+    pcm = (np.clip(audio, -1, 1) * 32767).astype('<i2')
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+def parse_mix(spec: str) -> dict:
+    """"short=0.6,medium=0.4" -> {'short': 0.6, 'medium': 0.4} (chuẩn hoá tổng = 1)"""
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in AUDIO_PROFILES:
+            raise ValueError(f"Unknown audio profile: {name} (available: {', '.join(AUDIO_PROFILES)})")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError('Mix weights must be positive')
+    return {name: weight / total for name, weight in mix.items()}
+
+# ========================== APP SERVER ==========================
+GUNICORN_CONFIG = '''
+def post_worker_init(worker):
+    import cognitive_assessment
+    cognitive_assessment.initialize_system(max_score=100)
+'''
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_app(args, workdir: str, openai_url: str):
+    """Chạy app trong thư mục tạm (results/, ../frontend/text-records nằm trong đó)"""
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': REPO_DIR + os.pathsep + env.get('PYTHONPATH', ''),
+        'OPENAI_API_KEY': 'stub-key',
+        'OPENAI_BASE_URL': openai_url,
+        'PYTHONUNBUFFERED': '1',
+    })
+    if args.transcriber == 'fake':
+        env['TRANSCRIBE_BACKEND'] = 'fake'
+        env['FAKE_TRANSCRIBE_LATENCY_MS'] = str(args.fake_transcribe_ms)
+    else:
+        env['TRANSCRIBE_BACKEND'] = 'whisper'
+        env['WHISPER_MODEL'] = 'tiny'
+
+    if args.server == 'gunicorn':
+        config_path = os.path.join(workdir, 'gunicorn_loadtest.py')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            f.write(GUNICORN_CONFIG)
+        command = [sys.executable, '-m', 'gunicorn', '-c', config_path, '-b', f"127.0.0.1:{port}",
+                   '-w', str(args.workers), '--threads', str(args.threads), '--timeout', '300',
+                   'cognitive_assessment:app']
+    else:
+        command = [sys.executable, '-c',
+                   'import cognitive_assessment as ca; ca.initialize_system(max_score=100); '
+                   f"ca.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+
+    log = open(os.path.join(workdir, 'server.log'), 'w', encoding='utf-8')
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=2) as response:
+                if response.status == 200:
+                    return process, base_url, log
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.25)
+
+    process.kill()
+    log.close()
+    raise RuntimeError(f"App did not become healthy, see {log.name}")
+
+def process_tree(pid: int) -> list:
+    """pid + các tiến trình con (gunicorn workers), đọc từ /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        stack.extend(children.get(current, []))
+    return pids
+
+def peak_memory_mb(pid: int) -> dict:
+    """VmHWM (RSS đỉnh) của từng tiến trình trong cây, MB"""
+    peaks = {}
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status", 'r') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peaks[current] = int(line.split()[1]) / 1024.0
+                        break
+        except OSError:
+            continue
+    return peaks
+
+# ========================== LOAD DRIVER ==========================
+def encode_multipart(fields: dict, file_field: str, filename: str, content: bytes):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode('utf-8'))
+    body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{file_field}\"; "
+               f"filename=\"{filename}\"\r\nContent-Type: audio/wav\r\n\r\n".encode('utf-8'))
+    body.write(content)
+    body.write(f"\r\n--{boundary}--\r\n".encode('utf-8'))
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+def send_request(base_url: str, profile: str, audio: bytes, index: int, features: str, timeout: float) -> dict:
+    fields = {
+        'age': 65,
+        'gender': 'Nam',
+        'userId': f"loadtest_user_{index % 50}",
+        'question': 'Hãy kể về một ngày bình thường của bạn.',
+        'questionId': index % 10,
+    }
+    if features:
+        fields['features'] = features
+    body, content_type = encode_multipart(fields, 'audioFile', f"{profile}.wav", audio)
+    http_request = urllib.request.Request(f"{base_url}/assess-file", data=body, method='POST',
+                                          headers={'Content-Type': content_type})
+
+    started = time.perf_counter()
+    ok, error = False, None
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            payload = json.loads(response.read())
+            ok = bool(payload.get('success'))
+            if not ok:
+                error = payload.get('error', 'unsuccessful response')
+    except urllib.error.HTTPError as e:
+        error = f"HTTP {e.code}"
+    except Exception as e:
+        error = str(e)
+    return {'profile': profile, 'latency': time.perf_counter() - started, 'ok': ok, 'error': error}
+
+def latency_summary(latencies: list) -> dict:
+    if not latencies:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    values = np.asarray(latencies) * 1000
+    return {
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(np.max(values)),
+    }
+
+def run_load(args, base_url: str, recordings: dict, mix: dict) -> tuple:
+    rng = random.Random(args.seed)
+    names, weights = list(mix), list(mix.values())
+    stop_at = time.monotonic() + args.duration if args.duration else None
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+    samples = []
+
+    def next_job():
+        with lock:
+            index = next(counter)
+            if stop_at is None and index >= args.requests:
+                return None
+            if stop_at is not None and time.monotonic() >= stop_at:
+                return None
+            return index, rng.choices(names, weights)[0]
+
+    def user_loop():
+        while True:
+            job = next_job()
+            if job is None:
+                return
+            index, profile = job
+            result = send_request(base_url, profile, recordings[profile], index, args.features, args.timeout)
+            with lock:
+                samples.append(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for _ in range(args.concurrency):
+            pool.submit(user_loop)
+    return samples, time.perf_counter() - started
+
+def build_report(args, samples: list, elapsed: float, memory: dict) -> dict:
+    errors = [s for s in samples if not s['ok']]
+    report = {
+        'config': {
+            'server': args.server,
+            'workers': args.workers if args.server == 'gunicorn' else 1,
+            'concurrency': args.concurrency,
+            'transcriber': args.transcriber,
+            'features': args.features or 'default',
+            'mix': args.mix,
+        },
+        'requests': len(samples),
+        'errors': len(errors),
+        'error_rate': len(errors) / len(samples) if samples else 0.0,
+        'elapsed_s': elapsed,
+        'throughput_rps': len(samples) / elapsed if elapsed > 0 else 0.0,
+        'latency': latency_summary([s['latency'] for s in samples if s['ok']]),
+        'latency_by_profile': {
+            profile: latency_summary([s['latency'] for s in samples if s['ok'] and s['profile'] == profile])
+            for profile in sorted({s['profile'] for s in samples})
+        },
+        'peak_memory_mb': {str(pid): round(mb, 1) for pid, mb in memory.items()},
+        'error_samples': sorted({s['error'] for s in errors})[:10],
+    }
+    return report
+
+def print_report(report: dict):
+    print("=" * 60)
+    print("📊 Load test report")
+    print("=" * 60)
+    config = report['config']
+    print(f"  Server: {config['server']} x{config['workers']}   Concurrency: {config['concurrency']}   "
+          f"Transcriber: {config['transcriber']}   Features: {config['features']}")
+    print(f"  Requests: {report['requests']}   Errors: {report['errors']} ({report['error_rate']:.1%})")
+    print(f"  Throughput: {report['throughput_rps']:.2f} req/s over {report['elapsed_s']:.1f}s")
+    latency = report['latency']
+    print(f"  Latency: p50 {latency['p50_ms']:.0f} ms   p95 {latency['p95_ms']:.0f} ms   "
+          f"p99 {latency['p99_ms']:.0f} ms   max {latency['max_ms']:.0f} ms")
+    for profile, summary in report['latency_by_profile'].items():
+        print(f"    {profile:<7} p50 {summary['p50_ms']:.0f} ms   p95 {summary['p95_ms']:.0f} ms   "
+              f"p99 {summary['p99_ms']:.0f} ms")
+    for pid, mb in report['peak_memory_mb'].items():
+        print(f"  Peak RSS pid {pid}: {mb:.1f} MB")
+    for error in report['error_samples']:
+        print(f"  ⚠️  {error}")
+    print("=" * 60)
+
+def check_thresholds(args, report: dict) -> list:
+    failures = []
+    if args.max_p95_ms is not None and report['latency']['p95_ms'] > args.max_p95_ms:
+        failures.append(f"p95 {report['latency']['p95_ms']:.0f} ms > {args.max_p95_ms} ms")
+    if args.max_error_rate is not None and report['error_rate'] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    if args.min_throughput is not None and report['throughput_rps'] < args.min_throughput:
+        failures.append(f"throughput {report['throughput_rps']:.2f} req/s < {args.min_throughput} req/s")
+    if args.max_worker_mb is not None:
+        for pid, mb in report['peak_memory_mb'].items():
+            if mb > args.max_worker_mb:
+                failures.append(f"pid {pid} peak RSS {mb:.0f} MB > {args.max_worker_mb} MB")
+    return failures
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='End-to-end load test for /assess-file')
+    parser.add_argument('--server', choices=['flask', 'gunicorn'], default='flask')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent simulated users')
+    parser.add_argument('--requests', type=int, default=50, help='total requests (ignored with --duration)')
+    parser.add_argument('--duration', type=float, default=None, help='run for N seconds instead')
+    parser.add_argument('--warmup', type=int, default=2, help='requests sent before measuring')
+    parser.add_argument('--mix', default='short=0.6,medium=0.3,long=0.1',
+                        help=f"audio mix, profiles: {', '.join(AUDIO_PROFILES)}")
+    parser.add_argument('--features', default='', help='feature profile or groups sent with each request')
+    parser.add_argument('--transcriber', choices=['fake', 'whisper-tiny'], default='fake')
+    parser.add_argument('--fake-transcribe-ms', type=float, default=200, help='fake backend latency per batch')
+    parser.add_argument('--openai-latency-ms', type=float, default=300, help='stub OpenAI response latency')
+    parser.add_argument('--timeout', type=float, default=300, help='per-request timeout (s)')
+    parser.add_argument('--startup-timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', dest='json_path', help='write the report as JSON')
+    parser.add_argument('--keep-workdir', action='store_true', help='keep results and server log')
+    parser.add_argument('--max-p95-ms', type=float, default=None)
+    parser.add_argument('--max-error-rate', type=float, default=None)
+    parser.add_argument('--min-throughput', type=float, default=None)
+    parser.add_argument('--max-worker-mb', type=float, default=None)
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    mix = parse_mix(args.mix)
+    recordings = {name: synthesize_recording(AUDIO_PROFILES[name], seed=args.seed + i)
+                  for i, name in enumerate(mix)}
+
+    tmp_root = tempfile.mkdtemp(prefix='cavang_loadtest_')
+    workdir = os.path.join(tmp_root, 'app')
+    os.makedirs(workdir)
+    stub = start_stub_openai(args.openai_latency_ms)
+    process, log = None, None
+    try:
+        process, base_url, log = start_app(args, workdir, f"http://127.0.0.1:{stub.server_address[1]}/v1")
+        print(f"App running at {base_url} (workdir {workdir})")
+
+        for i in range(args.warmup):
+            name = list(mix)[i % len(mix)]
+            send_request(base_url, name, recordings[name], -1 - i, args.features, args.timeout)
+
+        samples, elapsed = run_load(args, base_url, recordings, mix)
+        report = build_report(args, samples, elapsed, peak_memory_mb(process.pid))
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if log is not None:
+            log.close()
+        stub.shutdown()
+        if not args.keep_workdir:
+            shutil.rmtree(tmp_root, ignore_errors=True)
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = check_thresholds(args, report)
+    for failure in failures:
+        print(f"❌ Threshold exceeded: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# cognitive_assessment.py là module đơn ở gốc repo (không có package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
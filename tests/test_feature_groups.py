@@ -0,0 +1,34 @@
+import pytest
+
+import cognitive_assessment as ca
+
+
+@pytest.fixture
+def extractor():
+    return ca.AudioFeatureExtractor()
+
+
+def test_profiles_combine_with_groups(extractor):
+    assert extractor.resolve_feature_groups('scoring,mfcc') == ['vad', 'pitch', 'pauses', 'mfcc']
+    assert extractor.resolve_feature_groups(['mfcc', 'scoring']) == ['vad', 'mfcc', 'pitch', 'pauses']
+
+
+@pytest.mark.parametrize('selection', ['', [], 5, {'pitch': True}, ['pitch', 5], 'pitch,nope'])
+def test_invalid_selection_raises_value_error(extractor, selection):
+    with pytest.raises(ValueError):
+        extractor.resolve_feature_groups(selection)
+
+
+@pytest.mark.parametrize('selection', [5, '', [], 'scoring,bogus'])
+def test_assess_rejects_invalid_selection_with_400(monkeypatch, selection):
+    monkeypatch.setattr(ca, 'assessor', ca.CognitiveAssessment())
+    response = ca.app.test_client().post('/assess', json={
+        'audio_path': 'missing.wav', 'transcribed_text': 'xin chào', 'features': selection
+    })
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_assessment_adds_scoring_groups():
+    assessor = ca.CognitiveAssessment()
+    assert assessor.resolve_feature_groups('mfcc') == ['vad', 'mfcc', 'pitch', 'pauses']
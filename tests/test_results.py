@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+import cognitive_assessment as ca
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ca, 'user_trends', ca.UserTrendStore())
+    return tmp_path
+
+
+def make_result(score=70.0):
+    return {
+        'audio_features': {'speech_rate': 90.0, 'sildur_mean': 0.6, 'pitch_std': 25.0},
+        'combined_assessment': {'combined_score': score, 'risk_level': 'Low Risk - Bình thường'},
+    }
+
+
+def test_results_saved_in_same_second_do_not_overwrite(workdir):
+    files = {ca.save_result(make_result(), {'age': 60}, user_id='u1') for _ in range(5)}
+    assert None not in files
+    assert len(files) == 5
+    assert len(os.listdir(workdir / 'results')) == 6  # 5 kết quả + thư mục users
+    assert ca.user_trends.get_trend('u1')['count'] == 5
+
+
+@pytest.mark.parametrize('user_id', [None, '', ca.ANONYMOUS_USER_ID])
+def test_anonymous_results_skip_trend(workdir, user_id):
+    assert ca.save_result(make_result(), {'age': 60}, user_id=user_id)
+    assert ca.user_trends.get_trend(ca.ANONYMOUS_USER_ID) is None
+    assert not os.path.exists(workdir / 'results' / 'users')
@@ -0,0 +1,31 @@
+import numpy as np
+
+import cognitive_assessment as ca
+
+
+def test_finalize_without_audio_reports_error():
+    session = ca.StreamingAssessmentSession(ca.CognitiveAssessment())
+    result, transcript = session.finalize({'age': 60})
+    assert result['audio_features']['error'] == 'Not enough audio received'
+    assert transcript == ''
+
+
+def test_finalize_too_short_reports_error():
+    session = ca.StreamingAssessmentSession(ca.CognitiveAssessment(), input_sample_rate=48000)
+    session.add_chunk(np.zeros(4096, dtype=np.float32))
+    result, _ = session.finalize()
+    assert 'error' in result['audio_features']
+
+
+def test_finalize_with_speech_has_features():
+    sr = 22050
+    t = np.arange(sr) / sr
+    tone = (0.3 * np.sin(2 * np.pi * 150 * t)).astype(np.float32)
+    audio = np.concatenate([tone, np.zeros(sr // 2, dtype=np.float32), tone])
+    session = ca.StreamingAssessmentSession(ca.CognitiveAssessment())
+    for start in range(0, len(audio), 4096):
+        session.add_chunk(audio[start:start + 4096])
+    result, _ = session.finalize()
+    features = result['audio_features']
+    assert 'error' not in features
+    assert features['number_utt'] == 2
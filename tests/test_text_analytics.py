@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+import cognitive_assessment as ca
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    records = tmp_path / 'text-records'
+    records.mkdir()
+    transcripts = [
+        "Hôm nay tôi đi chợ mua rau và cá. Sau đó tôi về nhà nấu cơm.",
+        "Tôi đi chợ. Tôi đi chợ. Tôi đi chợ.",
+        "Hòa bình... hoà bình 3.5 kg",
+    ]
+    for i, text in enumerate(transcripts):
+        (records / f"user{i}_q1.txt").write_text(text, encoding='utf-8')
+
+    monkeypatch.setattr(ca, 'batch_text_analyzer', ca.BatchTextAnalyzer(str(records), batch_size=2))
+    monkeypatch.setattr(ca, 'TEXT_COHORT_FILE', str(tmp_path / 'results' / 'text_cohort.npz'))
+    monkeypatch.setattr(ca, 'text_cohort_norms', None)
+    return ca.app.test_client()
+
+
+def test_build_then_score(client):
+    response = client.post('/text-analytics/build', json={})
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert body['count'] == 3
+    assert os.path.exists(ca.TEXT_COHORT_FILE)
+
+    # Chuẩn cohort phải đọc lại được từ file .npz (như sau khi restart server)
+    ca.text_cohort_norms = None
+    response = client.post('/text-analytics/score', json={'text': 'Tôi đi chợ mua rau.'})
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()['data']
+    assert set(data) == set(ca.BatchTextAnalyzer.METRICS)
+    assert data['word_count']['value'] == 5
+    assert 0 <= data['word_count']['percentile'] <= 100
+
+
+def test_saved_columns_keep_filenames(client):
+    client.post('/text-analytics/build', json={})
+    with ca.np.load(ca.TEXT_COHORT_FILE) as cohort:
+        assert sorted(cohort['filename']) == ['user0_q1.txt', 'user1_q1.txt', 'user2_q1.txt']
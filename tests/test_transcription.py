@@ -0,0 +1,60 @@
+import threading
+
+import numpy as np
+import pytest
+
+import cognitive_assessment as ca
+
+SR = ca.WHISPER_SAMPLE_RATE
+
+
+class BlockingBackend:
+    """Ghi lại độ dài các clip; có thể giữ worker bận để tạo tồn đọng"""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.batches = []
+
+    def transcribe_batch(self, audios):
+        self.entered.set()
+        self.release.wait(5)
+        self.batches.append([len(audio) for audio in audios])
+        return [f"w{i}" for i in range(len(audios))]
+
+
+def noise(seconds):
+    return np.random.default_rng(0).normal(0, 0.1, int(seconds * SR)).astype(np.float32)
+
+
+def test_long_clip_is_split_into_windows():
+    backend = BlockingBackend()
+    scheduler = ca.TranscriptionScheduler(backend, max_wait_ms=50)
+    assert scheduler.transcribe(noise(75), SR) == 'w0 w1 w2'
+    assert all(length <= 30 * SR for length in backend.batches[0])
+
+
+def test_clip_over_window_limit_is_rejected_on_idle_server():
+    scheduler = ca.TranscriptionScheduler(BlockingBackend(), max_queue=64, max_windows=2)
+    with pytest.raises(ca.TranscriptionTooLong):
+        scheduler.submit(noise(75), SR)
+
+
+def test_window_limit_never_exceeds_queue_size():
+    scheduler = ca.TranscriptionScheduler(BlockingBackend(), max_queue=3, max_windows=20)
+    assert scheduler.max_windows == 3
+    assert scheduler.transcribe(noise(75), SR) == 'w0 w1 w2'
+
+
+def test_backlog_raises_queue_full():
+    backend = BlockingBackend()
+    backend.release.clear()
+    scheduler = ca.TranscriptionScheduler(backend, max_queue=3, max_wait_ms=1)
+    busy = scheduler.submit(noise(1), SR)
+    assert backend.entered.wait(5)  # worker đang bị giữ trong batch đầu
+    scheduler.submit(noise(1), SR)
+    with pytest.raises(ca.TranscriptionQueueFull):
+        scheduler.submit(noise(75), SR)
+    backend.release.set()
+    assert busy.result(timeout=5) == 'w0'